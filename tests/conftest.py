@@ -1,4 +1,6 @@
 import os
+
+import pytest
 from django.utils.version import get_version
 # from yatube import INSTALLED_APPS
 
@@ -40,4 +42,11 @@ assert any(
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'tests.fixtures.fixture_bench',
 ]
+
+
+@pytest.fixture(autouse=True)
+def thumbnails_in_request(settings):
+    """Миниатюры считаются сразу, без фоновых потоков."""
+    settings.THUMBNAIL_WORKERS = 0
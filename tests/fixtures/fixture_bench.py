@@ -0,0 +1,43 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from posts.models import Comment, Follow, Group, Post
+
+
+def bench_size(name, default):
+    """Размер набора данных задаётся переменными окружения BENCH_*."""
+    return int(os.environ.get(f'BENCH_{name.upper()}', default))
+
+
+def looped(values):
+    """Бесконечный генератор по значениям: mixer принимает генераторы."""
+    while True:
+        yield from values
+
+
+@pytest.fixture
+def bench_data(mixer, django_user_model):
+    """Набор пользователей, групп, постов, подписок и комментариев."""
+    users = mixer.cycle(bench_size('users', 20)).blend(django_user_model)
+    groups = mixer.cycle(bench_size('groups', 5)).blend(Group)
+    posts = mixer.cycle(bench_size('posts', 200)).blend(
+        Post,
+        author=looped(users),
+        group=looped(groups),
+        image='',
+    )
+    follows_per_user = min(bench_size('follows', 5), len(users) - 1)
+    for number, user in enumerate(users):
+        for shift in range(1, follows_per_user + 1):
+            Follow.objects.create(
+                user=user, author=users[(number + shift) % len(users)]
+            )
+    post = posts[-1]
+    mixer.cycle(bench_size('comments', 50)).blend(
+        Comment, post=post, author=looped(users)
+    )
+    return SimpleNamespace(
+        users=users, groups=groups, posts=posts, post=post,
+        user=post.author, group=post.group,
+    )
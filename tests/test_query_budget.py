@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.urls import urlpatterns
+
+# Сколько SQL-запросов может сделать страница при холодном кеше.
+# Бюджет не зависит от размера данных: N+1 сразу его превысит.
+QUERY_BUDGETS = {
+    'index': 7,
+    'group_list': 7,
+    'profile': 9,
+    'post_detail': 7,
+    'post_comments': 5,
+    'create_post': 5,
+    'post_edit': 7,
+    'add_comment': 5,
+    'follow_index': 8,
+    'profile_follow': 8,
+    'profile_unfollow': 12,
+    'joke': 4,
+    'search': 6,
+    'export': 4,
+}
+# Параметры запроса для страниц, которым без них нечего показать
+QUERY_STRINGS = {
+    'search': '?q=пост',
+}
+
+BENCH_OUTPUT = os.environ.get('BENCH_OUTPUT', 'bench_results.json')
+
+
+def url_kwargs(data, pattern):
+    values = {
+        'slug': data.group.slug,
+        'username': data.users[1].username,
+        'post_id': data.post.pk,
+    }
+    return {name: values[name] for name in pattern.pattern.converters}
+
+
+def measure(client, url):
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - started
+    return {
+        'url': url,
+        'status': response.status_code,
+        'queries': len(queries),
+        'time_ms': round(elapsed * 1000, 2),
+        'bytes': len(response.content),
+    }
+
+
+class TestQueryBudget:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_views_fit_query_budget(self, client, bench_data):
+        client.force_login(bench_data.user)
+        results = {}
+        for pattern in urlpatterns:
+            url = reverse(
+                f'posts:{pattern.name}',
+                kwargs=url_kwargs(bench_data, pattern),
+            ) + QUERY_STRINGS.get(pattern.name, '')
+            results[pattern.name] = measure(client, url)
+
+        with open(BENCH_OUTPUT, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2, ensure_ascii=False)
+
+        assert set(results) == set(QUERY_BUDGETS), (
+            'Добавьте бюджет запросов для новых страниц в `QUERY_BUDGETS`'
+        )
+        over_budget = {
+            name: result['queries']
+            for name, result in results.items()
+            if result['queries'] > QUERY_BUDGETS[name]
+        }
+        assert not over_budget, (
+            f'Страницы превысили бюджет SQL-запросов: {over_budget}'
+        )
@@ -0,0 +1,75 @@
+import json
+import os
+import statistics
+import time
+
+import pytest
+from django.core.cache import cache
+from django.template import engines
+
+from posts.models import Post
+
+PAGE_SIZES = (10, 50, 100)
+REPEAT = int(os.environ.get('BENCH_REPEAT', 20))
+BENCH_RENDER_OUTPUT = os.environ.get(
+    'BENCH_RENDER_OUTPUT', 'bench_render.json'
+)
+
+# Так карточки выводились до тега post_cards
+INCLUDE_LOOP = '''
+{% for post in posts %}
+  {% include 'includes/post_card.html' %}
+  {% if not forloop.last %}<hr>{% endif %}
+{% endfor %}
+'''
+POST_CARDS = '{% load post_cards %}{% post_cards posts %}'
+# Без кеша post_cards рендерит карточки не быстрее include: выигрыш
+# только на попаданиях в кеш карточек, его и проверяем с запасом
+MIN_CACHED_SPEEDUP = 3
+
+
+def render_ms(source, posts, cold=True):
+    """
+    Медиана времени рендеринга. cold: каждый раз с пустым кешем, иначе
+    post_cards после первого прохода только достаёт карточки из кеша.
+    """
+    template = engines['django'].from_string(source)
+    timings = []
+    for _ in range(REPEAT):
+        if cold:
+            cache.clear()
+        started = time.perf_counter()
+        html = template.render({'posts': posts})
+        timings.append((time.perf_counter() - started) * 1000)
+    return html, round(statistics.median(timings), 3)
+
+
+class TestRenderBench:
+
+    @pytest.mark.django_db
+    def test_post_cards_render_time(self, mixer, django_user_model):
+        mixer.cycle(5).blend(django_user_model)
+        mixer.cycle(max(PAGE_SIZES)).blend(
+            Post, author=mixer.SELECT, image=''
+        )
+        results = {}
+        for size in PAGE_SIZES:
+            posts = list(Post.objects.for_listing()[:size])
+            include_html, include_ms = render_ms(INCLUDE_LOOP, posts)
+            cards_html, cards_ms = render_ms(POST_CARDS, posts)
+            cached_html, cached_ms = render_ms(POST_CARDS, posts, cold=False)
+            assert cards_html.count('Дата публикации') == size
+            assert include_html.count('Дата публикации') == size
+            assert cached_html == cards_html
+            assert cached_ms * MIN_CACHED_SPEEDUP < include_ms, (
+                f'Карточки из кеша ({cached_ms} мс) должны выводиться '
+                f'заметно быстрее include ({include_ms} мс)'
+            )
+            results[size] = {
+                'include_ms': include_ms,
+                'post_cards_ms': cards_ms,
+                'post_cards_cached_ms': cached_ms,
+            }
+
+        with open(BENCH_RENDER_OUTPUT, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,61 @@
+"""
+Пользователи для AuthenticationMiddleware из общего кеша.
+
+CachedModelBackend.get_user читает пользователя из кеша
+USER_CACHE_ALIAS и ходит в базу только при промахе. Запись
+удаляется при любом сохранении пользователя (правка профиля, смена
+пароля, обновление last_login), при его удалении и при выходе, так
+что следующий запрос перечитает пользователя из базы.
+
+Кеш берётся общий, без памяти процесса: выход или блокировка
+пользователя должны сразу действовать во всех воркерах.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model, user_logged_out
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+USER_KEY = 'auth:user:%s'
+
+User = get_user_model()
+
+
+def _cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def forget_user(user_id):
+    """
+    Удаляет пользователя из кеша сейчас и ещё раз после коммита, иначе
+    параллельный запрос успеет закешировать старую версию.
+    """
+    key = USER_KEY % user_id
+    _cache().delete(key)
+    transaction.on_commit(lambda: _cache().delete(key))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = USER_KEY % user_id
+        user = _cache().get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            _cache().set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_changed_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
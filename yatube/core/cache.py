@@ -0,0 +1,329 @@
+"""
+Кеш-бэкенды, общие для всех процессов на одном хосте.
+
+SQLiteCache хранит записи в файле SQLite (режим WAL), поэтому
+сброс или запись в одном воркере сразу видна остальным. Вытеснение —
+LRU по времени последнего чтения, incr/decr атомарны между процессами.
+
+TwoTierCache ставит перед общим кешем маленький кеш в памяти процесса
+с коротким временем жизни, чтобы горячие ключи не ходили в файл.
+Его попадания и промахи видит профилировщик (core.profiler).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import profiler
+
+# Чаще, чем раз в столько секунд, время доступа к записи не обновляем:
+# для LRU такой точности хватает, а чтение не превращается в запись
+ACCESS_RESOLUTION = 10
+# Размер таблицы проверяем не на каждой записи: COUNT(*) в SQLite
+# проходит всю таблицу
+CULL_CHECK_EVERY = 100
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB, '
+                'expires REAL, accessed REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_accessed '
+                'ON cache (accessed)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.writes = 0
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _dumps(self, value):
+        # Целые числа храним как есть: так их видно и в sqlite3-консоли
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _loads(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _fetch(self, connection, keys):
+        now = time.time()
+        placeholders = ','.join('?' * len(keys))
+        rows = connection.execute(
+            f'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders})',
+            keys,
+        ).fetchall()
+        found, stale = {}, []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            found[key] = self._loads(value)
+            if accessed < now - ACCESS_RESOLUTION:
+                stale.append(key)
+        if stale:
+            placeholders = ','.join('?' * len(stale))
+            connection.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({placeholders})',
+                [now, *stale],
+            )
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        found = self._fetch(self._connection(), [key])
+        return found.get(key, default)
+
+    def get_many(self, keys, version=None):
+        keymap = {self._key(key, version): key for key in keys}
+        if not keymap:
+            return {}
+        found = self._fetch(self._connection(), list(keymap))
+        return {keymap[key]: value for key, value in found.items()}
+
+    def _write(self, connection, rows, replace=True):
+        now = time.time()
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        cursor = connection.executemany(
+            f'{verb} INTO cache (key, value, expires, accessed) '
+            f'VALUES (?, ?, ?, ?)',
+            [(key, self._dumps(value), expires, now)
+             for key, value, expires in rows],
+        )
+        return cursor.rowcount
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version), value, expires)
+            for key, value in data.items()
+        ]
+        connection = self._connection()
+        with self._transaction(connection):
+            self._write(connection, rows)
+            self._cull(connection)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with self._transaction(connection):
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            added = self._write(
+                connection,
+                [(key, value, self.get_backend_timeout(timeout))],
+                replace=False,
+            )
+            self._cull(connection)
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return bool(cursor.rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with self._transaction(connection):
+            row = connection.execute(
+                'SELECT value FROM cache '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._dumps(value), key),
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._fetch(self._connection(), [key])
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            placeholders = ','.join('?' * len(keys))
+            self._connection().execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', keys
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение переживает запрос: открывать файл заново дороже,
+        # чем держать его открытым в потоке
+        pass
+
+    def _cull(self, connection):
+        self._local.writes += 1
+        if self._local.writes % CULL_CHECK_EVERY:
+            return
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (count // self._cull_frequency,),
+        )
+
+    class _transaction:
+        """BEGIN IMMEDIATE: блокировка на запись берётся сразу."""
+
+        def __init__(self, connection):
+            self.connection = connection
+
+        def __enter__(self):
+            self.connection.execute('BEGIN IMMEDIATE')
+
+        def __exit__(self, exc_type, exc, traceback):
+            if exc_type is None:
+                self.connection.execute('COMMIT')
+            else:
+                self.connection.execute('ROLLBACK')
+
+
+class TwoTierCache(BaseCache):
+    """
+    LOCATION — алиас общего кеша из CACHES. L1 живёт в памяти процесса
+    не дольше OPTIONS['L1_TIMEOUT'] секунд: это верхняя граница того,
+    насколько воркер может отстать от записи, сделанной другим воркером.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._l1 = LocMemCache(f'two-tier-{location}', {
+            'TIMEOUT': self._l1_timeout,
+            'OPTIONS': {
+                'MAX_ENTRIES': options.get('L1_MAX_ENTRIES', 1000),
+            },
+        })
+
+    @property
+    def _l2(self):
+        return caches[self._l2_alias]
+
+    def _l1_timeout_for(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self._l1_timeout
+        return max(0, min(self._l1_timeout, timeout - time.time()))
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = self._l1.get(key, sentinel, version)
+        if value is sentinel:
+            value = self._l2.get(key, sentinel, version)
+            if value is sentinel:
+                profiler.record_cache(hits=0, misses=1)
+                return default
+            self._l1.set(key, value, self._l1_timeout, version)
+        profiler.record_cache(hits=1, misses=0)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = self._l1.get_many(keys, version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            fetched = self._l2.get_many(missing, version)
+            self._l1.set_many(fetched, self._l1_timeout, version)
+            found.update(fetched)
+        profiler.record_cache(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l2.set(key, value, timeout, version)
+        self._l1.set(key, value, self._l1_timeout_for(timeout), version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self._l2.set_many(data, timeout, version)
+        self._l1.set_many(data, self._l1_timeout_for(timeout), version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1.delete(key, version)
+        return self._l2.add(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._l2.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1.delete(key, version)
+        return self._l2.incr(key, delta, version)
+
+    def has_key(self, key, version=None):
+        return (
+            self._l1.has_key(key, version)
+            or self._l2.has_key(key, version)
+        )
+
+    def delete(self, key, version=None):
+        self._l1.delete(key, version)
+        self._l2.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        self._l1.delete_many(keys, version)
+        self._l2.delete_many(keys, version)
+
+    def clear(self):
+        self._l1.clear()
+        self._l2.clear()
@@ -0,0 +1,176 @@
+"""
+Сжатие HTML-ответов gzip или brotli (если установлен пакет brotli).
+
+Страницы из кеша (posts.page_cache.cache_versioned) сжимаются один раз,
+перед записью в кеш: precompress кладёт сжатые тела в атрибут ответа,
+и они кешируются вместе с ним. На попадании в кеш CompressionMiddleware
+только выбирает готовое тело по Accept-Encoding. Остальные ответы
+сжимаются на лету быстрым уровнем.
+
+Vary: Accept-Encoding добавляется уже после записи в кеш, так что ключ
+страницы от Accept-Encoding не зависит: одна запись хранит все варианты.
+
+В странице с частичками пользователя (core.fragments) общий текст
+между метками сжимается заранее отдельными кусками deflate, каждый со
+сбросом словаря (Z_FULL_FLUSH). Такие куски можно склеивать, поэтому
+на попадании сжимаются только сами частички, а gzip собирается из
+готовых кусков.
+"""
+import gzip
+import struct
+import zlib
+
+from django.utils.cache import patch_vary_headers
+
+from .fragments import split
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Меньше этого сжатие не окупает заголовков
+MIN_SIZE = 200
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript',
+    'application/xml', 'image/svg+xml',
+)
+# Уровни для заранее сжатых и для сжимаемых на лету ответов
+STORED_LEVELS = {'br': 9, 'gzip': 9}
+LIVE_LEVELS = {'br': 4, 'gzip': 5}
+# Заголовок gzip без имени файла и времени, ОС неизвестна
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# Пустой последний блок deflate
+DEFLATE_END = b'\x03\x00'
+
+
+def _gzip(data, level):
+    return gzip.compress(data, compresslevel=level)
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _deflate_chunk(data, level):
+    """Кусок deflate, который можно склеить с любыми другими такими же."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+
+def gzip_from_chunks(chunks, content):
+    """gzip из кусков _deflate_chunk; content — всё несжатое тело."""
+    return b''.join((
+        GZIP_HEADER,
+        *chunks,
+        DEFLATE_END,
+        struct.pack('<II', zlib.crc32(content), len(content) & 0xffffffff),
+    ))
+
+
+def compressors():
+    """Доступные кодировки в порядке предпочтения."""
+    if brotli is not None:
+        yield 'br', _brotli
+    yield 'gzip', _gzip
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding, кроме запрещённых через q=0."""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        encoding, _, quality = item.partition(';')
+        quality = quality.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+def compressible(response):
+    return (
+        not response.streaming
+        and not response.has_header('Content-Encoding')
+        and len(response.content) >= MIN_SIZE
+        and response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+    )
+
+
+def precompress(response):
+    """
+    Сжимает тело всеми кодировками, чтобы закешировать их с ответом.
+    Если в теле есть метки частичек, заранее сжимается только общий
+    текст между ними.
+    """
+    if not compressible(response):
+        return response
+    parts = split(response.content.decode(response.charset))
+    if len(parts) > 1:
+        response.compressed_chunks = [
+            _deflate_chunk(
+                part.encode(response.charset), STORED_LEVELS['gzip']
+            )
+            for part in parts[::2]
+        ]
+        return response
+    response.compressed_content = {
+        encoding: compressor(response.content, STORED_LEVELS[encoding])
+        for encoding, compressor in compressors()
+    }
+    return response
+
+
+def _assemble_gzip(response):
+    """gzip страницы с частичками из заранее сжатых кусков или None."""
+    chunks = getattr(response, 'compressed_chunks', None)
+    parts = getattr(response, 'fragment_parts', None)
+    if chunks is None or parts is None or len(chunks) != len(parts[::2]):
+        return None
+    chunks = [
+        chunks[index // 2] if index % 2 == 0
+        else _deflate_chunk(part, LIVE_LEVELS['gzip'])
+        for index, part in enumerate(parts)
+    ]
+    return gzip_from_chunks(chunks, response.content)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request)
+        stored = getattr(response, 'compressed_content', {})
+        content = None
+        if 'gzip' in accepted:
+            # Готовый gzip дешевле brotli, сжимаемого на лету
+            content = _assemble_gzip(response)
+            encoding = 'gzip'
+        if content is None:
+            for encoding, compressor in compressors():
+                if encoding in accepted:
+                    break
+            else:
+                return response
+            content = stored.get(encoding)
+        if content is None:
+            content = compressor(response.content, LIVE_LEVELS[encoding])
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        # Сжатое тело не совпадает побайтно с несжатым, как и в
+        # GZipMiddleware
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,87 @@
+"""
+Части страницы, зависящие от пользователя, поверх общего кеша страниц.
+
+Закешированная страница (posts.page_cache.cache_versioned) одна на всех
+посетителей: меню, кнопка подписки, форма комментария и прочие частички
+для конкретного пользователя выводятся тегом {% user_fragment %} как
+метки <!--fragment:имя?параметры-->. Перед отправкой fill заменяет
+метки на результат зарегистрированных функций fragment(request, ...).
+На страницах, которые не кешируются, тег сразу выводит частичку.
+
+Параметры меток — строки. Метки заполняются только в HTML-ответах, где
+пользовательский текст экранирован, и «<» метки из него не получить.
+Метка с незарегистрированным именем заменяется пустой строкой.
+"""
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+PLACEHOLDER = '<!--fragment:%s?%s-->'
+PATTERN = re.compile(r'<!--fragment:([\w.]+)\?([^<>]*?)-->')
+
+_registry = {}
+
+
+def fragment(name):
+    """Регистрирует функцию частички: (request, **params) -> HTML."""
+    def decorator(function):
+        _registry[name] = function
+        return function
+    return decorator
+
+
+def render(request, name, **params):
+    function = _registry.get(name)
+    if function is None:
+        return ''
+    return function(request, **params)
+
+
+def placeholder(name, **params):
+    return mark_safe(PLACEHOLDER % (name, urlencode(params)))
+
+
+def split(content):
+    """
+    Делит HTML на куски: чётные — общий текст страницы, нечётные —
+    метки (имя, параметры). Кусков всегда нечётное число.
+    """
+    parts = PATTERN.split(content)
+    result = []
+    for index in range(0, len(parts), 3):
+        result.append(parts[index])
+        if index + 1 < len(parts):
+            params = dict(parse_qsl(parts[index + 2]))
+            result.append((parts[index + 1], params))
+    return result
+
+
+def fill(request, response):
+    """
+    Подставляет частички пользователя в ответ. Куски тела остаются в
+    response.fragment_parts: core.compression собирает из них gzip,
+    не пережимая общий текст.
+    """
+    if not response.get('Content-Type', '').startswith('text/html'):
+        # В JSON и прочих ответах текст пользователей не экранирован
+        return response
+    content = response.content.decode(response.charset)
+    if '<!--fragment:' not in content:
+        return response
+    parts = [
+        part if index % 2 == 0 else render(request, part[0], **part[1])
+        for index, part in enumerate(split(content))
+    ]
+    response.fragment_parts = [
+        part.encode(response.charset) for part in parts
+    ]
+    response.content = b''.join(response.fragment_parts)
+    return response
+
+
+@fragment('user_nav')
+def user_nav(request):
+    """Пункты меню для вошедшего пользователя или ссылки входа."""
+    return render_to_string('includes/user_nav.html', request=request)
@@ -0,0 +1,121 @@
+"""
+Профилировщик запросов, который можно держать включённым в бою.
+
+ProfilerMiddleware замеряет долю запросов PROFILER_SAMPLE_RATE: общее
+время, число и время SQL-запросов, попадания и промахи кеша и время
+рендеринга шаблонов. Замеры складываются в кольцевой буфер процесса
+на PROFILER_BUFFER_SIZE записей, сводку по именам адресов отдаёт
+/__perf__/ (core.views.perf).
+
+Кеш (core.cache.TwoTierCache) и шаблоны (core.template_backends) сами
+сообщают о себе через record_cache и record_template, если текущий
+запрос замеряется.
+"""
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+METRICS = (
+    'wall_ms', 'sql_count', 'sql_ms', 'cache_hits', 'cache_misses',
+    'template_ms',
+)
+PERCENTILES = (50, 95, 99)
+
+_local = threading.local()
+_lock = threading.Lock()
+_samples = deque(maxlen=settings.PROFILER_BUFFER_SIZE)
+
+
+def current():
+    """Замер текущего запроса или None, если запрос не замеряется."""
+    return getattr(_local, 'sample', None)
+
+
+def record_cache(hits, misses):
+    sample = current()
+    if sample is not None:
+        sample['cache_hits'] += hits
+        sample['cache_misses'] += misses
+
+
+def record_template(seconds):
+    sample = current()
+    if sample is not None:
+        sample['template_ms'] += seconds * 1000
+
+
+def _sql_wrapper(sample):
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            sample['sql_count'] += 1
+            sample['sql_ms'] += (time.perf_counter() - started) * 1000
+    return wrapper
+
+
+def samples():
+    with _lock:
+        return list(_samples)
+
+
+def clear():
+    with _lock:
+        _samples.clear()
+
+
+def _percentile(values, percent):
+    """Перцентиль методом ближайшего ранга; values отсортированы."""
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[rank - 1]
+
+
+def summary():
+    """Перцентили каждой метрики по именам адресов."""
+    grouped = {}
+    for sample in samples():
+        grouped.setdefault(sample['view'], []).append(sample)
+    result = {}
+    for view, view_samples in sorted(grouped.items()):
+        stats = {'count': len(view_samples)}
+        for metric in METRICS:
+            values = sorted(sample[metric] for sample in view_samples)
+            stats[metric] = {
+                f'p{percent}': round(_percentile(values, percent), 2)
+                for percent in PERCENTILES
+            }
+        result[view] = stats
+    return result
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILER_SAMPLE_RATE:
+            return self.get_response(request)
+        sample = dict.fromkeys(METRICS, 0)
+        _local.sample = sample
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_sql_wrapper(sample))
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.sample = None
+        sample['wall_ms'] = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        sample['view'] = match.view_name if match else 'unresolved'
+        with _lock:
+            _samples.append(sample)
+        return response
@@ -0,0 +1,129 @@
+"""
+Ограничение частоты запросов, общее для всех процессов.
+
+Лимиты задаются в settings.RATE_LIMITS по именам адресов:
+{'posts:add_comment': {'user': '20/m', 'ip': '60/m'}}. Счётчики живут
+в общем кеше, и каждое обращение — атомарные add и incr, поэтому
+воркеры не могут вместе пропустить больше лимита. Окно скользящее:
+к текущему периоду добавляется прошлый с весом оставшейся доли, так
+что на стыке периодов не проходит двойной лимит.
+
+RateLimitMiddleware проверяет запросы методов RATE_LIMIT_METHODS;
+декоратор ratelimit — все запросы view, например записывающие GET.
+Сверх лимита отвечаем 429 с Retry-After.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.http import HttpResponse
+
+KEY = 'ratelimit:%s:%s'
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """'20/m' -> (20, 60)."""
+    limit, period = rate.split('/')
+    return int(limit), PERIODS[period]
+
+
+def retry_after(previous, current, limit, period, elapsed):
+    """
+    Через сколько секунд повторный запрос уложится в лимит, если других
+    не будет. Вес прошлого периода убывает линейно, а после смены
+    периода прошлым становится текущий.
+    """
+    # Место под сам повторный запрос
+    room = limit - 1
+    if current <= room:
+        # Успеем в этом же периоде, когда прошлый достаточно полегчает
+        return period * (1 - (room - current) / previous) - elapsed
+    return period - elapsed + period * (1 - room / current)
+
+
+def hit(key, limit, period, cache=None, now=None):
+    """
+    Учитывает запрос. Возвращает None, если лимит не превышен, иначе
+    через сколько секунд стоит повторить.
+    """
+    cache = cache or default_cache
+    now = time.time() if now is None else now
+    window = int(now // period)
+    elapsed = now - window * period
+    current_key = KEY % (key, window)
+    cache.add(current_key, 0, period * 2)
+    current = cache.incr(current_key)
+    previous = cache.get(KEY % (key, window - 1), 0)
+    weight = 1 - elapsed / period
+    if previous * weight + current <= limit:
+        return None
+    wait = retry_after(previous, current, limit, period, elapsed)
+    return max(1, math.ceil(wait))
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse(
+        'Слишком много запросов, попробуйте позже',
+        status=429,
+        content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def check(request, name):
+    """Ответ 429, если запрос к view name превышает её лимиты."""
+    limits = settings.RATE_LIMITS.get(name, {})
+    for kind, rate in limits.items():
+        if kind == 'user':
+            user = getattr(request, 'user', None)
+            if user is None or not user.is_authenticated:
+                continue
+            ident = user.pk
+        else:
+            ident = client_ip(request)
+        retry_after = hit(f'{name}:{kind}:{ident}', *parse_rate(rate))
+        if retry_after is not None:
+            return too_many_requests(retry_after)
+    return None
+
+
+def ratelimit(name=None):
+    """
+    Лимит для всех запросов к view, в том числе GET. name — ключ
+    RATE_LIMITS, по умолчанию имя адреса.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = check(
+                request, name or request.resolver_match.view_name
+            )
+            if response is not None:
+                return response
+            return view(request, *args, **kwargs)
+        wrapper.rate_limited = True
+        return wrapper
+    return decorator
+
+
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'rate_limited', False):
+            return None
+        if request.method not in settings.RATE_LIMIT_METHODS:
+            return None
+        return check(request, request.resolver_match.view_name)
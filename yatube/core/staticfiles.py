@@ -0,0 +1,159 @@
+"""
+Статика с хешами в именах, заранее сжатая при collectstatic.
+
+CompressedManifestStaticFilesStorage после обычной обработки
+ManifestStaticFilesStorage (хеш содержимого в имени, манифест,
+переписанные url() в CSS) кладёт рядом с каждым хешированным текстовым
+файлом .gz и, если установлен brotli, .br. Тег {% static %} отдаёт
+имена из манифеста.
+
+StaticFilesMiddleware раздаёт STATIC_ROOT: выбирает сжатый вариант по
+Accept-Encoding, а файлам с хешем в имени ставит Cache-Control
+immutable на год — их содержимое по этому адресу уже не изменится.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage, staticfiles_storage,
+)
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+
+from .compression import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (
+    '.css', '.js', '.map', '.json', '.svg', '.txt', '.xml', '.html',
+    '.ico', '.eot', '.ttf', '.otf',
+)
+# Мелкие файлы сжатие не уменьшает заметно
+MIN_SIZE = 256
+IMMUTABLE = f'public, max-age={60 * 60 * 24 * 365}, immutable'
+REVALIDATE = 'public, max-age=60'
+# Кодировка Accept-Encoding -> расширение файла, по предпочтению
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _gzip(data):
+    # mtime=0: одинаковый файл при каждой сборке
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def compressors(self):
+        yield '.gz', _gzip
+        if brotli is not None:
+            yield '.br', _brotli
+
+    def compress(self, name):
+        """Пишет сжатые копии файла, если они заметно меньше."""
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_SIZE:
+            return
+        for extension, compressor in self.compressors():
+            compressed = compressor(data)
+            if len(compressed) < len(data) * 0.95:
+                with open(self.path(name + extension), 'wb') as output:
+                    output.write(compressed)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.lower().endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # collectstatic ещё не запускали (тесты, разработка):
+            # отдаём исходное имя, как обычное хранилище
+            return name
+
+
+class StaticFilesMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        # Файлы в STATIC_ROOT меняются только при выкладке, вместе с
+        # перезапуском процесса. Промахи не запоминаются, чтобы
+        # случайные адреса не раздували словарь
+        self.found = {}
+
+    def __call__(self, request):
+        if (
+            request.method in ('GET', 'HEAD')
+            and settings.STATIC_ROOT
+            and request.path_info.startswith(self.prefix)
+        ):
+            response = self.serve(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def find(self, name):
+        """
+        (путь, {кодировка: путь к сжатой копии}, есть ли хеш в имени)
+        или None.
+        """
+        found = self.found.get(name)
+        if found is None:
+            found = self._find(name)
+            if found is not None:
+                self.found[name] = found
+        return found
+
+    def _find(self, name):
+        try:
+            path = staticfiles_storage.path(name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+        variants = {
+            encoding: path + extension
+            for encoding, extension in ENCODINGS
+            if os.path.isfile(path + extension)
+        }
+        hashed = name in set(staticfiles_storage.hashed_files.values())
+        return path, variants, hashed
+
+    def serve(self, request):
+        name = posixpath.normpath(request.path_info[len(self.prefix):])
+        found = self.find(name)
+        if found is None:
+            return None
+        path, variants, hashed = found
+        accepted = accepted_encodings(request)
+        encoding = next(
+            (encoding for encoding, _ in ENCODINGS
+             if encoding in variants and encoding in accepted),
+            None,
+        )
+        content_type = mimetypes.guess_type(path)[0]
+        response = FileResponse(
+            open(variants[encoding] if encoding else path, 'rb'),
+            content_type=content_type or 'application/octet-stream',
+        )
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if variants:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        response['Cache-Control'] = IMMUTABLE if hashed else REVALIDATE
+        return response
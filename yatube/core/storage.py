@@ -0,0 +1,150 @@
+"""
+Файловое хранилище с адресацией по содержимому.
+
+Файл называется sha256 своего содержимого и раскладывается по двум
+уровням каталогов: posts/ab/cd/abcd…ef.jpg. Так в одном каталоге
+не бывает больше нескольких сотен файлов, а одинаковые загрузки
+ложатся в один и тот же файл.
+
+Число ссылок на файл не хранится отдельно, а считается по строкам
+моделей, чьи FileField используют это хранилище: такой счётчик
+не расходится с базой ни при bulk_create, ни при удалении каскадом.
+Файл без ссылок удаляет release, забытые файлы находит orphans. Оба
+не трогают файлы моложе grace секунд: одинаковую картинку могли только
+что загрузить для поста, который ещё не закоммичен.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(r'^[0-9a-f]{64}(\.\w+)?$')
+# Имена попадают в IN (...): держимся ниже лимита параметров SQLite
+BATCH_SIZE = 500
+GRACE = 60 * 60
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, directory, digest, extension):
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя означает одинаковое содержимое
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        # Хеш считается на лету, пока файл пишется во временный
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.path(directory), prefix='.upload-'
+        )
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = self.hashed_name(directory, digest.hexdigest(), extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(temp_path)
+                # Свежая ссылка: orphans не тронет файл до коммита поста
+                os.utime(full_path)
+                return name
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            # Параллельная загрузка того же файла перезапишет его тем же
+            # содержимым
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def owns(self, name):
+        """Назван ли файл по содержимому; старые файлы не учитываются."""
+        return bool(name) and bool(HASHED_NAME.match(os.path.basename(name)))
+
+    def _fields(self):
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if (
+                    isinstance(field, models.FileField)
+                    and isinstance(field.storage, ContentAddressedStorage)
+                    and field.storage.location == self.location
+                ):
+                    yield model, field
+
+    def referenced(self, names):
+        """Те из names, на которые ссылается хоть одна строка."""
+        names = list(names)
+        found = set()
+        for model, field in self._fields():
+            found.update(
+                model._default_manager.filter(
+                    **{f'{field.name}__in': names}
+                ).values_list(field.name, flat=True)
+            )
+        return found
+
+    def references(self, name):
+        """Число строк, ссылающихся на файл."""
+        return sum(
+            model._default_manager.filter(**{field.name: name}).count()
+            for model, field in self._fields()
+        )
+
+    def is_fresh(self, name, grace):
+        return os.path.getmtime(self.path(name)) > time.time() - grace
+
+    def release(self, name, grace=GRACE):
+        """
+        Удаляет файл, если на него больше никто не ссылается. Свежий
+        файл остаётся, его потом удалит orphans.
+        """
+        if (
+            not self.owns(name)
+            or not self.exists(name)
+            or self.is_fresh(name, grace)
+            or self.references(name)
+        ):
+            return False
+        self.delete(name)
+        return True
+
+    def hashed_files(self):
+        """Имена всех файлов хранилища, названных по содержимому."""
+        for root, _, files in os.walk(self.location):
+            directory = os.path.relpath(root, self.location)
+            for filename in files:
+                if HASHED_NAME.match(filename):
+                    yield os.path.normpath(
+                        os.path.join(directory, filename)
+                    ).replace('\\', '/')
+
+    def orphans(self, grace=GRACE):
+        """
+        Файлы без ссылок старше grace секунд. Свежие пропускаются:
+        их пост может быть ещё не закоммичен.
+        """
+        batch = []
+        for name in self.hashed_files():
+            if not self.is_fresh(name, grace):
+                batch.append(name)
+            if len(batch) >= BATCH_SIZE:
+                yield from sorted(set(batch) - self.referenced(batch))
+                batch = []
+        if batch:
+            yield from sorted(set(batch) - self.referenced(batch))
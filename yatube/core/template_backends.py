@@ -0,0 +1,30 @@
+"""
+Бэкенд шаблонов Django, сообщающий профилировщику (core.profiler)
+время рендеринга. Замеряется только шаблон верхнего уровня: include
+рендерятся внутри него движком и второй раз не считаются.
+"""
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import profiler
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        if profiler.current() is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profiler.record_template(time.perf_counter() - started)
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return ProfiledTemplate(template.template, self)
@@ -0,0 +1,19 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..fragments import placeholder, render
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def user_fragment(context, name, **params):
+    """
+    Частичка страницы для текущего пользователя, см. core.fragments.
+    В странице для общего кеша выводит метку, иначе саму частичку.
+    """
+    request = context.get('request')
+    params = {key: str(value) for key, value in params.items()}
+    if getattr(request, 'shared_page', False):
+        return placeholder(name, **params)
+    return mark_safe(render(request, name, **params))
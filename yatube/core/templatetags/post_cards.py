@@ -0,0 +1,65 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/post_card.html'
+SEPARATOR = '\n<hr>\n'
+CARD_KEY = 'post_card:%s:%s:%s:%s'
+
+
+def _card_key(template_name, options, post):
+    flags = ','.join(f'{name}={value}' for name, value in sorted(
+        options.items()
+    ))
+    # version растёт при каждом изменении карточки (posts.signals)
+    return CARD_KEY % (template_name, flags, post.pk, post.version)
+
+
+def render_cards(context, posts, template_name=CARD_TEMPLATE, **options):
+    """
+    HTML карточек постов в порядке posts. Готовые карточки берутся из
+    кеша одним get_many, рендерятся только недостающие. Шаблон
+    карточки ищется один раз, контекст дополняется один раз на
+    страницу, и у каждой карточки рендерится сразу её nodelist.
+    """
+    posts = list(posts)
+    keys = [_card_key(template_name, options, post) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {
+        key: post for key, post in zip(keys, posts) if key not in cards
+    }
+    if missing:
+        # При кеширующем загрузчике шаблон компилируется раз на процесс
+        card = context.template.engine.get_template(template_name)
+        rendered = {}
+        with context.push(**options):
+            for key, post in missing.items():
+                context['post'] = post
+                rendered[key] = card.nodelist.render(context)
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, template_name=CARD_TEMPLATE, **options):
+    """
+    Карточки всех постов страницы, разделённые <hr>, вместо
+    {% include %} в цикле. options попадают в контекст карточки,
+    например detail_link=True или group_link=True.
+    """
+    return mark_safe(SEPARATOR.join(
+        render_cards(context, posts, template_name, **options)
+    ))
+
+
+@register.simple_tag(takes_context=True)
+def post_card_list(context, posts, template_name=CARD_TEMPLATE, **options):
+    """
+    Список HTML карточек для шаблонов, где цикл по постам нужен свой:
+    {% post_card_list page_obj as cards %}.
+    """
+    return render_cards(context, posts, template_name, **options)
@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..auth import USER_KEY, CachedModelBackend
+
+User = get_user_model()
+
+
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='old-pass-1')
+        self.client.login(username='user', password='old-pass-1')
+        self.cache = caches['shared']
+
+    def test_authenticated_request_skips_database(self):
+        url = reverse('about:author')
+        self.client.get(url)
+        # Читающий запрос не открывает и транзакцию
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_user_edit_invalidates_cache(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        self.user.first_name = 'Лев'
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(self.user.pk).first_name, 'Лев')
+
+    def test_logout_forgets_user(self):
+        self.client.get(reverse('about:author'))
+        self.assertIsNotNone(self.cache.get(USER_KEY % self.user.pk))
+        self.client.get(reverse('users:logout'))
+        self.assertIsNone(self.cache.get(USER_KEY % self.user.pk))
+        response = self.client.get(reverse('about:author'))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_password_change_logs_out_other_sessions(self):
+        other = Client()
+        other.login(username='user', password='old-pass-1')
+        other.get(reverse('about:author'))
+        self.client.post(reverse('password_change'), {
+            'old_password': 'old-pass-1',
+            'new_password1': 'new-pass-2-long',
+            'new_password2': 'new-pass-2-long',
+        })
+        response = self.client.get(reverse('about:author'))
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+        response = other.get(reverse('about:author'))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
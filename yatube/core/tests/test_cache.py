@@ -0,0 +1,103 @@
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase, override_settings
+from django.core.cache import caches
+
+from ..cache import SQLiteCache
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = f'{self.directory}/cache.sqlite3'
+        self.cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_and_expiry(self):
+        self.cache.set('key', {'value': 1})
+        self.cache.set('short', 'value', timeout=0.1)
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertEqual(self.cache.get_many(['key', 'missing']),
+                         {'key': {'value': 1}})
+        time.sleep(0.2)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 'new'))
+        self.assertFalse(self.cache.add('short', 'newer'))
+
+    def test_entries_shared_between_instances(self):
+        """Другой процесс открывает тот же файл и видит те же записи."""
+        self.cache.set('key', 'value')
+        other = SQLiteCache(self.location, {})
+        self.assertEqual(other.get('key'), 'value')
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_least_recently_used_entries_evicted(self):
+        self.cache.set('old', 'value')
+        self.cache._connection().execute(
+            "UPDATE cache SET accessed = 0 WHERE key LIKE '%old'"
+        )
+        for number in range(100):
+            self.cache.set(f'key-{number}', number)
+        self.assertIsNone(self.cache.get('old'))
+        self.assertEqual(self.cache.get('key-99'), 99)
+
+    def test_incr_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        workers = [
+            multiprocessing.Process(
+                target=_increment, args=(self.location, 50)
+            )
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': 'l2',
+        'OPTIONS': {'L1_TIMEOUT': 60},
+    },
+    'l2': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+})
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.l2 = caches['l2']
+        self.cache.clear()
+
+    def test_reads_served_from_l1(self):
+        self.cache.set('key', 'value')
+        self.l2.set('key', 'changed elsewhere')
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_writes_go_through_to_l2(self):
+        self.cache.set('key', 1)
+        self.assertEqual(self.l2.get('key'), 1)
+        self.assertEqual(self.cache.incr('key'), 2)
+        self.assertEqual(self.cache.get('key'), 2)
+        self.cache.delete('key')
+        self.assertIsNone(self.l2.get('key'))
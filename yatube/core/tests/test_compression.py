@@ -0,0 +1,66 @@
+import gzip
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import compression
+
+User = get_user_model()
+
+
+class CompressionMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост номер {number}')
+            for number in range(10)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, encoding):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+
+    def test_cached_page_is_compressed_once(self):
+        url = reverse('posts:index')
+        plain = self.get(url, '')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        with mock.patch.object(
+            compression, '_gzip', side_effect=AssertionError
+        ), mock.patch.object(compression, 'brotli', None):
+            response = self.get(url, 'gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(
+            response['Content-Length'], str(len(response.content))
+        )
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+        # Сжатый ответ сверяется с тем же ETag
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_live_compression_and_small_bodies(self):
+        response = self.get(reverse('about:author'), 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        response = self.get(reverse('about:author'), 'gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+
+        response = self.get(reverse('posts:index'), 'identity')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertFalse(compression.compressible(HttpResponse('ok')))
@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import profiler
+
+User = get_user_model()
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiler.clear()
+
+    @override_settings(PROFILER_SAMPLE_RATE=1)
+    def test_sampled_request_is_recorded(self):
+        self.client.get(reverse('posts:index'))
+
+        [sample] = profiler.samples()
+        self.assertEqual(sample['view'], 'posts:index')
+        self.assertGreater(sample['wall_ms'], 0)
+        self.assertGreater(sample['sql_count'], 0)
+        self.assertGreater(sample['template_ms'], 0)
+        self.assertGreater(sample['cache_hits'] + sample['cache_misses'], 0)
+
+    @override_settings(PROFILER_SAMPLE_RATE=0)
+    def test_unsampled_request_is_skipped(self):
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(profiler.samples(), [])
+
+    def test_percentiles(self):
+        for wall_ms in range(1, 101):
+            sample = dict.fromkeys(profiler.METRICS, 0)
+            sample.update(view='posts:index', wall_ms=wall_ms)
+            profiler._samples.append(sample)
+
+        stats = profiler.summary()['posts:index']
+        self.assertEqual(stats['count'], 100)
+        self.assertEqual(
+            stats['wall_ms'], {'p50': 50, 'p95': 95, 'p99': 99}
+        )
+
+    def test_perf_page_only_for_staff(self):
+        user = User.objects.create_user('user')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('perf')).status_code, 302)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('perf'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('views', response.json())
@@ -0,0 +1,130 @@
+import multiprocessing
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..cache import SQLiteCache
+from ..ratelimit import hit
+
+User = get_user_model()
+
+# Середина периода: окно не сменится посреди теста
+NOW = 60 * 1000 + 30
+
+
+def _hit_many(location, times, allowed):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        if hit('concurrent', 50, 60, cache=cache, now=NOW) is None:
+            with allowed.get_lock():
+                allowed.value += 1
+
+
+class HitTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache('ratelimit-tests', {})
+        self.cache.clear()
+
+    def test_limit_and_retry_after(self):
+        for _ in range(3):
+            self.assertIsNone(hit('key', 3, 60, cache=self.cache, now=NOW))
+        # В следующем периоде эти 4 запроса весят, пока не полегчают вдвое
+        self.assertEqual(hit('key', 3, 60, cache=self.cache, now=NOW), 60)
+
+    def test_previous_window_counts(self):
+        for _ in range(4):
+            hit('key', 4, 60, cache=self.cache, now=NOW - 60)
+        # Прошлый период заполнен и весит ещё половину
+        self.assertIsNone(hit('key', 4, 60, cache=self.cache, now=NOW))
+        self.assertIsNone(hit('key', 4, 60, cache=self.cache, now=NOW))
+        self.assertIsNotNone(hit('key', 4, 60, cache=self.cache, now=NOW))
+
+    def play(self, limit, hits):
+        """Ответ на последний из запросов hits: [(момент, число)]."""
+        for moment, count in hits:
+            for _ in range(count):
+                result = hit('key', limit, 60, cache=self.cache, now=moment)
+        return result
+
+    def test_retry_after_at_window_boundaries(self):
+        start = NOW - 30
+        scenarios = {
+            # limit, запросы, Retry-After
+            'конец периода': (3, [(start + 59.5, 4)], 31),
+            'начало периода': (4, [(start - 60, 4), (start, 1)], 30),
+            'лимит 1': (1, [(start + 30, 2)], 90),
+        }
+        for name, (limit, hits, expected) in scenarios.items():
+            with self.subTest(name):
+                self.cache.clear()
+                self.assertEqual(self.play(limit, hits), expected)
+                moment = hits[-1][0]
+                # Секундой раньше ещё рано, к Retry-After уже можно
+                self.cache.clear()
+                self.play(limit, hits)
+                self.assertIsNotNone(
+                    self.play(limit, [(moment + expected - 1, 1)])
+                )
+                self.cache.clear()
+                self.play(limit, hits)
+                self.assertIsNone(self.play(limit, [(moment + expected, 1)]))
+
+    def test_limit_holds_across_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        location = f'{directory}/cache.sqlite3'
+        # Файл кеша и режим WAL создаются до старта воркеров
+        SQLiteCache(location, {}).clear()
+        allowed = multiprocessing.Value('i', 0)
+        workers = [
+            multiprocessing.Process(
+                target=_hit_many, args=(location, 40, allowed)
+            )
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(allowed.value, 50)
+
+
+class RateLimitViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.author = User.objects.create_user('author')
+        cls.post = Post.objects.create(author=cls.author, text='пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    @override_settings(RATE_LIMITS={'posts:add_comment': {'user': '2/m'}})
+    def test_comment_limit(self):
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        for _ in range(2):
+            response = self.client.post(url, {'text': 'комментарий'})
+            self.assertEqual(response.status_code, 302)
+        response = self.client.post(url, {'text': 'комментарий'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Чтение не ограничено
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(RATE_LIMITS={'posts:profile_follow': {'ip': '1/m'}})
+    def test_follow_limit_by_ip(self):
+        url = reverse('posts:profile_follow', kwargs={'username': 'author'})
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.get(url).status_code, 429)
@@ -0,0 +1,68 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from ..staticfiles import IMMUTABLE, REVALIDATE
+
+STYLE = 'body { background: url("../img/logo.png"); }\n' + (
+    '.post { margin: 0 auto; padding: 1rem; }\n' * 50
+)
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        source = tempfile.mkdtemp()
+        root = tempfile.mkdtemp()
+        for directory in (source, root):
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        os.makedirs(os.path.join(source, 'css'))
+        os.makedirs(os.path.join(source, 'img'))
+        with open(os.path.join(source, 'css', 'style.css'), 'w') as style:
+            style.write(STYLE)
+        with open(os.path.join(source, 'img', 'logo.png'), 'wb') as logo:
+            logo.write(b'\x89PNG logo')
+        settings = override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=root
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.style = staticfiles_storage.stored_name('css/style.css')
+
+    def test_collectstatic_fingerprints_and_compresses(self):
+        logo = staticfiles_storage.stored_name('img/logo.png')
+        self.assertRegex(self.style, r'^css/style\.[0-9a-f]{12}\.css$')
+        self.assertRegex(logo, r'^img/logo\.[0-9a-f]{12}\.png$')
+        with staticfiles_storage.open(self.style) as style:
+            content = style.read()
+        self.assertIn(os.path.basename(logo).encode(), content)
+        with gzip.open(staticfiles_storage.path(self.style + '.gz')) as gz:
+            self.assertEqual(gz.read(), content)
+        # Картинки и мелкие файлы не сжимаются
+        self.assertFalse(staticfiles_storage.exists(logo + '.gz'))
+
+    def test_serves_precompressed_immutable(self):
+        url = staticfiles_storage.url('css/style.css')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertIn(b'.post', body)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn(b'.post', b''.join(response.streaming_content))
+
+    def test_unhashed_name_revalidates(self):
+        response = self.client.get('/static/css/style.css')
+        self.assertEqual(response['Cache-Control'], REVALIDATE)
+        response = self.client.get('/static/../settings.py')
+        self.assertEqual(response.status_code, 404)
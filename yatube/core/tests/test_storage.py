@@ -0,0 +1,51 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from ..storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_name_is_sharded_content_hash(self):
+        digest = hashlib.sha256(b'image').hexdigest()
+        name = self.storage.save('posts/Photo.JPG', ContentFile(b'image'))
+        self.assertEqual(
+            name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        )
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'image')
+
+    def test_identical_uploads_share_file(self):
+        first = self.storage.save('posts/a.png', ContentFile(b'same'))
+        second = self.storage.save('posts/b.png', ContentFile(b'same'))
+        other = self.storage.save('posts/c.png', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(
+            sorted(self.storage.hashed_files()), sorted({first, other})
+        )
+        # Временные файлы не остаются
+        self.assertFalse(any(
+            name.startswith('.upload-')
+            for name in os.listdir(self.storage.path('posts'))
+        ))
+
+    def test_release_spares_fresh_files(self):
+        name = self.storage.save('posts/a.png', ContentFile(b'fresh'))
+        self.assertFalse(self.storage.release(name, grace=60))
+        self.assertTrue(self.storage.exists(name))
+
+        old = time.time() - 120
+        os.utime(self.storage.path(name), (old, old))
+        self.assertTrue(self.storage.release(name, grace=60))
+        self.assertFalse(self.storage.exists(name))
@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import profiler
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -9,3 +14,15 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def perf(request):
+    """Перцентили замеров профилировщика по именам адресов."""
+    return JsonResponse(
+        {
+            'sample_rate': settings.PROFILER_SAMPLE_RATE,
+            'views': profiler.summary(),
+        },
+        json_dumps_params={'ensure_ascii': False, 'indent': 2},
+    )
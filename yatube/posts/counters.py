@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _count_subquery(model, field):
+    counted = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def recount_user(user_id):
+    """Пересчитывает счётчики одного пользователя с нуля."""
+    values = {
+        name: model.objects.filter(**{field: user_id}).count()
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=values
+    )
+    return stats
+
+
+def user_stats(user):
+    """Счётчики пользователя; при отсутствии строки она создаётся."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def change_user_counter(user_id, name, delta):
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{name: F(name) + delta}
+    )
+    if not updated and delta > 0:
+        recount_user(user_id)
+
+
+def change_comment_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta
+    )
+
+
+@transaction.atomic
+def recount_all():
+    """Восстанавливает все счётчики по исходным таблицам."""
+    Post.objects.update(comment_count=_count_subquery(Comment, 'post'))
+    users = User.objects.annotate(**{
+        name: _count_subquery(model, field)
+        for name, (model, field) in USER_COUNTERS.items()
+    }).values('pk', *USER_COUNTERS)
+    UserStats.objects.all().delete()
+    UserStats.objects.bulk_create(
+        (
+            UserStats(
+                user_id=row['pk'],
+                **{name: row[name] for name in USER_COUNTERS}
+            )
+            for row in users.iterator()
+        ),
+        batch_size=500,
+    )
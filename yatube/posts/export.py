@@ -0,0 +1,170 @@
+"""
+Потоковая выгрузка групп, постов, комментариев и подписок.
+
+Строки читаются через QuerySet.iterator() кусками по CHUNK_SIZE и сразу
+превращаются в строки NDJSON или CSV, поэтому память не растёт с
+размером выгрузки. Авторы и группы пишутся по username и slug, чтобы
+выгрузку можно было загрузить в другую базу (import_posts).
+"""
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Comment, Follow, Group, Post
+
+CHUNK_SIZE = 2000
+
+# Порядок важен для загрузки: сначала то, на что ссылаются
+FIELDS = {
+    'group': ('id', 'title', 'slug', 'description'),
+    'post': ('id', 'author', 'group', 'text', 'pub_date', 'image'),
+    'comment': ('id', 'post', 'author', 'text', 'created'),
+    'follow': ('user', 'author'),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Имена аннотаций не могут совпадать с полями модели
+RENAMED = {
+    'author_name': 'author',
+    'group_slug': 'group',
+    'post_ref': 'post',
+    'user_name': 'user',
+}
+
+
+def parse_bound(value, end=False):
+    """
+    Граница периода: дата или дата со временем в ISO 8601. Дата в
+    конце периода включается целиком.
+    """
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Неверная дата: {value}')
+        if end:
+            day += datetime.timedelta(days=1)
+        moment = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _period(field, since, until):
+    lookups = {}
+    if since is not None:
+        lookups[f'{field}__gte'] = since
+    if until is not None:
+        lookups[f'{field}__lt'] = until
+    return lookups
+
+
+def querysets(author=None, group=None, since=None, until=None):
+    """
+    Наборы строк каждой модели с учётом фильтров. Комментарии берутся
+    только к выбранным постам, подписки — только автора.
+    """
+    posts = Post.objects.filter(**_period('pub_date', since, until))
+    groups = Group.objects.all()
+    follows = Follow.objects.all()
+    if author is not None:
+        posts = posts.filter(author__username=author)
+        follows = follows.filter(author__username=author)
+    if group is not None:
+        posts = posts.filter(group__slug=group)
+        groups = groups.filter(slug=group)
+    comments = Comment.objects.filter(
+        post__in=posts.values('pk'), **_period('created', since, until)
+    )
+    return {
+        'group': groups.values(*FIELDS['group']),
+        'post': posts.values(
+            'id', 'text', 'pub_date', 'image',
+            author_name=F('author__username'),
+            group_slug=F('group__slug'),
+        ),
+        'comment': comments.values(
+            'id', 'text', 'created',
+            post_ref=F('post_id'),
+            author_name=F('author__username'),
+        ),
+        'follow': follows.values(
+            user_name=F('user__username'),
+            author_name=F('author__username'),
+        ),
+    }
+
+
+def records(models=None, **filters):
+    """Словари строк всех выбранных моделей по порядку FIELDS."""
+    selected = querysets(**filters)
+    for model in FIELDS:
+        if models and model not in models:
+            continue
+        rows = selected[model].order_by('pk').iterator(chunk_size=CHUNK_SIZE)
+        for row in rows:
+            record = {'model': model}
+            for key, value in row.items():
+                record[RENAMED.get(key, key)] = value
+            yield record
+
+
+class _Encoder(DjangoJSONEncoder):
+    """
+    Даты пишутся с микросекундами: по ним import_posts узнаёт уже
+    загруженные посты и комментарии.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def as_ndjson(records):
+    for record in records:
+        yield json.dumps(record, cls=_Encoder, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """Файл для csv.writer, который просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def as_csv(records, model):
+    fields = FIELDS[model]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for record in records:
+        yield writer.writerow([
+            value.isoformat() if isinstance(value, datetime.datetime)
+            else value
+            for value in (record[field] for field in fields)
+        ])
+
+
+def export(format, models=None, **filters):
+    """
+    Строки выгрузки. CSV бывает только у одной модели: у моделей
+    разные столбцы.
+    """
+    if format not in FORMATS:
+        raise ValueError(f'Неизвестный формат: {format}')
+    if models:
+        unknown = set(models) - set(FIELDS)
+        if unknown:
+            raise ValueError(f'Неизвестные модели: {", ".join(unknown)}')
+    if format == 'csv':
+        if not models or len(models) != 1:
+            raise ValueError('Для CSV нужно выбрать одну модель')
+        return as_csv(records(models, **filters), models[0])
+    return as_ndjson(records(models, **filters))
@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from .images import optimize
 from .models import Post
 
 from .models import Comment
@@ -17,6 +20,19 @@ class PostForm(forms.ModelForm):
             "group": "Группа",
         }
 
+    def clean_image(self):
+        image = self.cleaned_data["image"]
+        # Новая загрузка, а не уже сохранённая картинка поста
+        if isinstance(image, UploadedFile):
+            try:
+                return optimize(image)
+            except OSError:
+                # Заголовок прошёл проверку поля, а данные оборваны
+                raise forms.ValidationError(
+                    "Файл картинки повреждён", code="invalid_image"
+                )
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,35 @@
+"""Частички страниц постов для конкретного пользователя, см. core.fragments."""
+from django.template.loader import render_to_string
+
+from core.fragments import fragment
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@fragment('switcher')
+def switcher(request):
+    return render_to_string(
+        'posts/includes/switcher.html', request=request
+    )
+
+
+@fragment('follow_button')
+def follow_button(request, username):
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author__username=username
+    ).exists()
+    return render_to_string(
+        'posts/includes/follow_button.html',
+        {'username': username, 'following': following},
+        request,
+    )
+
+
+@fragment('comment_form')
+def comment_form(request, post_id):
+    return render_to_string(
+        'posts/includes/comment_form.html',
+        {'post_id': post_id, 'form': CommentForm()},
+        request,
+    )
@@ -0,0 +1,266 @@
+"""
+Массовая загрузка выгрузки export_posts (NDJSON) в базу.
+
+Файл читается построчно, строки копятся пачками одной модели и
+вставляются через bulk_create, каждая пачка — в своей транзакции.
+Сигналы при этом не срабатывают, поэтому счётчики, ленты, поисковый
+индекс, миниатюры и кеш страниц пересобираются один раз в конце.
+
+Авторы и группы приходят по username и slug, посты — со своими
+старыми id; соответствие старых id новым держится в памяти. Повторная
+загрузка ничего не дублирует: пост узнаётся по автору, дате
+публикации и хешу текста, комментарий — по посту, автору, дате и хешу
+текста. Совпавшие записи сливаются в одну строку, и все их старые id
+ведут на неё.
+"""
+import hashlib
+import json
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import page_cache, thumbnails, timeline
+from .counters import recount_all
+from .models import Comment, Follow, Group, Post, User
+from .search import get_backend
+
+# Ключи пачки попадают в IN (...): держимся ниже лимита
+# параметров SQLite
+BATCH_SIZE = 400
+
+
+@contextmanager
+def keep_dates():
+    """Отключает auto_now_add, чтобы сохранить исходные даты."""
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Comment._meta.get_field('created'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _digest(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def _moment(value):
+    moment = parse_datetime(value) if value else None
+    if moment is None:
+        return timezone.now()
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Importer:
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.users = {}
+        self.groups = {}
+        # Старый id поста -> новый
+        self.posts = {}
+        self.created = Counter()
+        self.skipped = Counter()
+        self.authors = set()
+        self.touched_posts = set()
+
+    def run(self, lines):
+        batch, model = [], None
+        with keep_dates():
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                full = len(batch) >= self.batch_size
+                if record['model'] != model or full:
+                    self.flush(model, batch)
+                    batch, model = [], record['model']
+                batch.append(record)
+            self.flush(model, batch)
+        self.rebuild()
+
+    def flush(self, model, batch):
+        if not batch:
+            return
+        handler = getattr(self, f'import_{model}', None)
+        if handler is None:
+            raise ValueError(f'Неизвестная модель: {model}')
+        with transaction.atomic():
+            handler(batch)
+
+    def resolve_users(self, usernames):
+        missing = set(usernames) - set(self.users)
+        if not missing:
+            return
+        User.objects.bulk_create(
+            (
+                User(username=username, password=make_password(None))
+                for username in missing
+            ),
+            ignore_conflicts=True,
+        )
+        self.users.update(
+            User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk')
+        )
+
+    def resolve_groups(self, slugs):
+        missing = set(slugs) - set(self.groups) - {None}
+        if missing:
+            self.groups.update(
+                Group.objects.filter(
+                    slug__in=missing
+                ).values_list('slug', 'pk')
+            )
+
+    def import_group(self, batch):
+        known = set(
+            Group.objects.filter(
+                slug__in=[record['slug'] for record in batch]
+            ).values_list('slug', flat=True)
+        )
+        new = [
+            Group(
+                title=record['title'],
+                slug=record['slug'],
+                description=record['description'],
+            )
+            for record in batch if record['slug'] not in known
+        ]
+        Group.objects.bulk_create(new, ignore_conflicts=True)
+        self.created['group'] += len(new)
+        self.skipped['group'] += len(batch) - len(new)
+
+    def _existing_posts(self, keys):
+        return {
+            (author_id, pub_date, _digest(text)): pk
+            for pk, author_id, pub_date, text in Post.objects.filter(
+                author_id__in={author_id for author_id, _, _ in keys},
+                pub_date__in={pub_date for _, pub_date, _ in keys},
+            ).values_list('pk', 'author_id', 'pub_date', 'text')
+        }
+
+    def _post_key(self, record):
+        return (
+            self.users[record['author']],
+            _moment(record['pub_date']),
+            _digest(record['text']),
+        )
+
+    def import_post(self, batch):
+        self.resolve_users(record['author'] for record in batch)
+        self.resolve_groups(record['group'] for record in batch)
+        keys = [(self._post_key(record), record) for record in batch]
+        keyed = {}
+        for key, record in keys:
+            keyed.setdefault(key, record)
+        existing = self._existing_posts(keyed)
+        new = [
+            Post(
+                author_id=author_id,
+                pub_date=pub_date,
+                text=record['text'],
+                group_id=self.groups.get(record.get('group')),
+                image=record.get('image') or '',
+            )
+            for (author_id, pub_date, digest), record in keyed.items()
+            if (author_id, pub_date, digest) not in existing
+        ]
+        Post.objects.bulk_create(new)
+        # bulk_create в SQLite не возвращает id, перечитываем
+        if new:
+            existing = self._existing_posts(keyed)
+        for key, record in keys:
+            self.posts[record['id']] = existing[key]
+        self.authors.update(author_id for author_id, _, _ in keyed)
+        self.created['post'] += len(new)
+        self.skipped['post'] += len(batch) - len(new)
+
+    def import_comment(self, batch):
+        self.resolve_users(record['author'] for record in batch)
+        keyed = {}
+        for record in batch:
+            post_id = self.posts.get(record['post'])
+            if post_id is None:
+                # Пост не попал в выгрузку
+                self.skipped['comment'] += 1
+                continue
+            key = (
+                post_id,
+                self.users[record['author']],
+                _moment(record['created']),
+                _digest(record['text']),
+            )
+            keyed[key] = record
+        existing = {
+            (post_id, author_id, created, _digest(text))
+            for post_id, author_id, created, text in Comment.objects.filter(
+                post_id__in={post_id for post_id, _, _, _ in keyed},
+                created__in={created for _, _, created, _ in keyed},
+            ).values_list('post_id', 'author_id', 'created', 'text')
+        }
+        new = [
+            Comment(
+                post_id=post_id,
+                author_id=author_id,
+                created=created,
+                text=record['text'],
+            )
+            for (post_id, author_id, created, digest), record in keyed.items()
+            if (post_id, author_id, created, digest) not in existing
+        ]
+        Comment.objects.bulk_create(new)
+        self.touched_posts.update(comment.post_id for comment in new)
+        self.created['comment'] += len(new)
+        self.skipped['comment'] += len(keyed) - len(new)
+
+    def import_follow(self, batch):
+        self.resolve_users(
+            username for record in batch
+            for username in (record['user'], record['author'])
+        )
+        pairs = {
+            (self.users[record['user']], self.users[record['author']])
+            for record in batch
+        }
+        existing = set(
+            Follow.objects.filter(
+                user_id__in={user_id for user_id, _ in pairs},
+                author_id__in={author_id for _, author_id in pairs},
+            ).values_list('user_id', 'author_id')
+        )
+        new = [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs - existing
+        ]
+        Follow.objects.bulk_create(new, ignore_conflicts=True)
+        self.authors.update(follow.author_id for follow in new)
+        self.created['follow'] += len(new)
+        self.skipped['follow'] += len(batch) - len(new)
+
+    def rebuild(self):
+        """Пересобирает всё, что обычно обновляют сигналы."""
+        recount_all()
+        timeline.rebuild_for_authors(self.authors)
+        get_backend().rebuild()
+        thumbnails.generate_missing()
+        scopes = set(page_cache.index_scopes())
+        for username in self.users:
+            scopes.update(page_cache.profile_scopes(username))
+        for slug in self.groups:
+            scopes.update(page_cache.group_scopes(slug))
+        for post_id in self.touched_posts:
+            scopes.update(page_cache.post_scopes(post_id))
+        page_cache.bump(*scopes)
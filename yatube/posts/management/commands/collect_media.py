@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки, на которые не ссылается ни один пост'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.MEDIA_GRACE,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+
+    def handle(self, *args, **options):
+        removed = collect_garbage(grace=options['grace'])
+        self.stdout.write(self.style.SUCCESS(f'Картинок удалено: {removed}'))
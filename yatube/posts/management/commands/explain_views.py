@@ -0,0 +1,71 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from posts import views
+from posts.models import Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет страницы лент и поста и печатает план (EXPLAIN) '
+        'каждого SELECT-запроса, чтобы проверить, что работают индексы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='От чьего имени открывать ленту подписок и профиль',
+        )
+
+    def get_targets(self, username):
+        user = (
+            User.objects.filter(username=username).first() if username
+            else User.objects.filter(posts__isnull=False).first()
+        )
+        post = Post.objects.order_by('-comment_count').first()
+        group = Group.objects.first()
+        if user is None or post is None:
+            raise CommandError('Нет пользователей с постами')
+        targets = [
+            ('index', views.index, {}, AnonymousUser()),
+            ('profile', views.profile, {'username': user.username}, user),
+            ('post_detail', views.post_detail, {'post_id': post.pk}, user),
+            ('follow_index', views.follow_index, {}, user),
+        ]
+        if group is not None:
+            targets.append(
+                ('group_list', views.group_posts, {'slug': group.slug}, user)
+            )
+        return targets
+
+    def explain(self, sql):
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}')
+            return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        for name, view, kwargs, user in self.get_targets(
+            options['username']
+        ):
+            request = factory.get('/')
+            request.user = user
+            with CaptureQueriesContext(connection) as queries:
+                view(request, **kwargs)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                self.stdout.write(f'  {sql}')
+                for line in self.explain(sql):
+                    style = (
+                        self.style.WARNING if 'SCAN' in line.upper()
+                        and 'USING' not in line.upper()
+                        else self.style.SUCCESS
+                    )
+                    self.stdout.write(style(f'    {line}'))
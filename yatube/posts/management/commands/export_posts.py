@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import FIELDS, FORMATS, export, parse_bound
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает группы, посты, комментарии и подписки '
+        'в NDJSON или CSV'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=FORMATS, default='ndjson',
+        )
+        parser.add_argument(
+            '--model', action='append', choices=FIELDS, dest='models',
+            help='Что выгружать; можно указать несколько раз. '
+                 'По умолчанию — всё',
+        )
+        parser.add_argument('--author', help='username автора постов')
+        parser.add_argument('--group', help='slug группы')
+        parser.add_argument('--since', help='Начало периода, ISO 8601')
+        parser.add_argument('--until', help='Конец периода, ISO 8601')
+        parser.add_argument(
+            '--output', help='Файл для выгрузки; по умолчанию stdout',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            lines = export(
+                options['format'],
+                options['models'],
+                author=options['author'],
+                group=options['group'],
+                since=options['since'] and parse_bound(options['since']),
+                until=options['until'] and parse_bound(
+                    options['until'], end=True
+                ),
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            output.writelines(lines)
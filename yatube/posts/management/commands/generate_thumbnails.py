@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import generate_missing
+
+
+class Command(BaseCommand):
+    help = 'Считает недостающие миниатюры картинок постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать миниатюры и у постов, где они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        done = generate_missing(regenerate=options['all'])
+        self.stdout.write(self.style.SUCCESS(f'Миниатюр посчитано: {done}'))
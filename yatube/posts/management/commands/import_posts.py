@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import BATCH_SIZE, Importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_posts (NDJSON) пачками через '
+        'bulk_create и пересобирает счётчики, ленты, поиск и миниатюры'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл NDJSON; «-» — читать из stdin',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько строк вставлять в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        importer = Importer(batch_size=options['batch_size'])
+        try:
+            if options['path'] == '-':
+                importer.run(sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8') as lines:
+                    importer.run(lines)
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(error)
+        for model, created in sorted(importer.created.items()):
+            self.stdout.write(
+                f'{model}: добавлено {created}, '
+                f'пропущено {importer.skipped[model]}'
+            )
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
@@ -1,7 +1,10 @@
+from django.core.files.storage import default_storage
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 
+from core.storage import ContentAddressedStorage
+
 
 User = get_user_model()
 
@@ -15,6 +18,24 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Посты со всем, что выводит карточка поста."""
+        return self.select_related('author', 'group').prefetch_related(
+            'thumbnails'
+        )
+
+    def bump_version(self):
+        """Сбрасывает закешированные карточки постов."""
+        return self.update(version=models.F('version') + 1)
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_thread(self):
+        """Комментарии в порядке публикации вместе с авторами."""
+        return self.select_related('author').order_by('created', 'id')
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name="Текст")
     pub_date = models.DateTimeField(
@@ -35,16 +56,61 @@ class Post(models.Model):
         related_name="posts",
         verbose_name="Группа",
     )
-    # Поле для картинки (необязательное)
+    # Поле для картинки (необязательное). Одинаковые картинки хранятся
+    # одним файлом, см. core.storage
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comment_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    # Растёт при любом изменении карточки поста, входит в ключ её
+    # кеша (core.templatetags.post_cards)
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        # Ленты группы и профиля: фильтр по внешнему ключу и сортировка
+        # по дате, id добавлен для keyset-пагинации (posts.pagination)
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.text[:15]}..."
 
+    def rendition(self, name):
+        """Готовая миниатюра картинки поста, см. posts.thumbnails."""
+        for thumbnail in self.thumbnails.all():
+            if thumbnail.name == name:
+                return thumbnail
+        return None
+
+    @property
+    def card_thumbnail(self):
+        return self.rendition('card')
+
+    @property
+    def detail_thumbnail(self):
+        return self.rendition('detail')
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -56,6 +122,16 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -71,3 +147,69 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост в ленте пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Копия Post.pub_date: лента листается по индексу этой таблицы,
+    # без соединения с постами и без сортировки (posts.timeline)
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя, см. posts.counters."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+
+class Thumbnail(models.Model):
+    """Миниатюра картинки поста, заранее посчитанная в фоне."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnails'
+    )
+    name = models.CharField(max_length=20)
+    path = models.CharField(max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('post', 'name')
+
+    @property
+    def url(self):
+        return default_storage.url(self.path)
@@ -0,0 +1,213 @@
+"""
+Кеш страниц с версионированными ключами.
+
+Каждая кешируемая страница зависит от набора «областей» (scope):
+лента, группа, профиль, пост. У каждой области в кеше лежит номер
+поколения, и он входит в ключ страницы. Сигналы моделей увеличивают
+поколение затронутых областей, после чего старые записи просто
+перестают находиться и вытесняются кешем сами.
+
+Те же поколения служат валидаторами условного GET: ETag страницы
+строится из них, а время последнего сброса областей идёт в
+Last-Modified. Совпавший запрос получает 304 без рендеринга шаблона.
+
+Поколения и время сброса читаются из кеша PAGE_VERSION_CACHE_ALIAS без
+памяти процесса: сброс должен сразу действовать во всех воркерах.
+В памяти процесса кешируются только сами страницы.
+"""
+import hashlib
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.utils.cache import (
+    get_cache_key, get_conditional_response, learn_cache_key,
+    patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from core.compression import precompress
+from core.fragments import fill
+
+GENERATION_KEY = 'posts:generation:%s'
+MODIFIED_KEY = 'posts:modified:%s'
+
+
+def _versions():
+    return caches[settings.PAGE_VERSION_CACHE_ALIAS]
+
+
+def _new_generation():
+    return time.time_ns()
+
+
+def generations(scopes):
+    """Текущие поколения областей в виде строки для префикса ключа."""
+    versions = _versions()
+    keys = [GENERATION_KEY % scope for scope in scopes]
+    values = versions.get_many(keys)
+    for key in keys:
+        if key not in values:
+            versions.add(key, _new_generation(), None)
+            values[key] = versions.get(key)
+    return '.'.join(str(values[key]) for key in keys)
+
+
+def last_modified(scopes):
+    """Время последнего сброса любой из областей, до секунды."""
+    versions = _versions()
+    keys = [MODIFIED_KEY % scope for scope in scopes]
+    values = versions.get_many(keys)
+    for key in keys:
+        if key not in values:
+            versions.add(key, math.ceil(time.time()), None)
+            values[key] = versions.get(key)
+    return math.ceil(max(values.values()))
+
+
+def _bump(scopes):
+    versions = _versions()
+    for scope in scopes:
+        key = GENERATION_KEY % scope
+        try:
+            versions.incr(key)
+        except ValueError:
+            versions.set(key, _new_generation(), None)
+        # Каждый сброс сдвигает время хотя бы на секунду: иначе сброс в
+        # ту же секунду, что и прошлый ответ, оставит Last-Modified
+        # прежним, и клиент получит 304 со старой страницей
+        key = MODIFIED_KEY % scope
+        modified = max(math.ceil(time.time()), versions.get(key, 0) + 1)
+        versions.set(key, modified, None)
+
+
+def bump(*scopes):
+    """
+    Сбрасывает страницы областей. Повторяем после коммита: иначе
+    параллельный запрос успеет закешировать ещё не обновлённые данные
+    под новым поколением.
+    """
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def index_scopes():
+    return ('posts',)
+
+
+def group_scopes(slug):
+    return (f'group:{slug}',)
+
+
+def profile_scopes(username):
+    return (f'profile:{username}',)
+
+
+def post_scopes(post_id):
+    # На странице поста выводится число постов автора
+    return (f'post:{post_id}', 'posts')
+
+
+def page_etag(request, prefix):
+    """
+    ETag зависит от поколений, пользователя, csrf-куки (она попадает
+    в формы страницы) и адреса вместе со строкой запроса.
+    """
+    user = getattr(request, 'user', None)
+    parts = (
+        prefix,
+        str(user.pk) if user is not None and user.is_authenticated else '',
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        request.get_full_path(),
+    )
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def _set_validators(request, response, etag, modified):
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    # Кеши по дороге хранят страницу, но каждый раз сверяют её с нами
+    patch_cache_control(response, no_cache=True)
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True)
+    return response
+
+
+def post_page_scopes(post):
+    """Все страницы, на которых выводится пост."""
+    scopes = ['posts', f'post:{post.pk}']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group.slug}')
+    scopes.append(f'profile:{post.author.username}')
+    return scopes
+
+
+def cache_versioned(scopes):
+    """
+    Аналог cache_page, но с префиксом ключа из поколений областей,
+    поэтому страницу можно держать в кеше долго. Условные запросы
+    (If-None-Match, If-Modified-Since) получают 304 до вызова view.
+
+    Страница рендерится без данных пользователя: его частички
+    ({% user_fragment %}) остаются метками, и одна запись в кеше
+    служит и гостям, и вошедшим пользователям. Метки заполняются
+    перед отправкой (core.fragments.fill).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            view_scopes = scopes(*args, **kwargs)
+            prefix = generations(view_scopes)
+            etag = page_etag(request, prefix)
+            # Время сброса не знает, кто смотрит страницу, поэтому
+            # вошедшим пользователям хватает одного ETag
+            modified = (
+                None if request.user.is_authenticated
+                else last_modified(view_scopes)
+            )
+            response = get_conditional_response(
+                request, etag=etag, last_modified=modified
+            )
+            if response is not None:
+                return _set_validators(request, response, etag, modified)
+            key = get_cache_key(request, prefix, 'GET', cache=cache)
+            response = cache.get(key) if key is not None else None
+            if response is None:
+                response = _render_shared(request, prefix, view, args, kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            fill(request, response)
+            # Частички пользователя берутся из сессии
+            patch_vary_headers(response, ('Cookie',))
+            return _set_validators(request, response, etag, modified)
+        return wrapper
+    return decorator
+
+
+def _render_shared(request, prefix, view, args, kwargs):
+    """Рендерит страницу с метками частичек и кладёт её в кеш."""
+    request.shared_page = True
+    try:
+        response = view(request, *args, **kwargs)
+    finally:
+        request.shared_page = False
+    if response.status_code != 200 or response.streaming:
+        return response
+    if request.META.get('CSRF_COOKIE_USED'):
+        # csrf-токен попал в саму страницу, а не в частичку: такой
+        # страницей можно делиться только с владельцем куки
+        if not request.COOKIES:
+            return response
+        patch_vary_headers(response, ('Cookie',))
+    timeout = settings.PAGE_CACHE_TIMEOUT
+    key = learn_cache_key(request, response, timeout, prefix, cache=cache)
+    # Сжатые тела кешируются вместе со страницей
+    cache.set(key, precompress(response), timeout)
+    return response
@@ -0,0 +1,290 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .page_cache import generations, index_scopes
+
+SELECT_LIMIT = 10
+COMMENTS_LIMIT = 20
+COUNT_KEY = "posts:count:%s"
+
+
+def _encode(moment, pk, direction):
+    payload = json.dumps(
+        [moment.isoformat(), pk, direction], separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def encode_cursor(post, direction):
+    """Упаковывает позицию поста (pub_date, id) в непрозрачный токен."""
+    return _encode(post.pub_date, post.pk, direction)
+
+
+def decode_cursor(token):
+    """
+    Распаковывает токен курсора.
+    Возвращает (pub_date, id, direction) или None для битого токена.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        pub_date, pk, direction = json.loads(
+            base64.urlsafe_b64decode(padded.encode())
+        )
+        pub_date = parse_datetime(pub_date)
+    except (binascii.Error, TypeError, ValueError):
+        return None
+    if pub_date is None or not isinstance(pk, int):
+        return None
+    if direction not in ("next", "prev"):
+        return None
+    return pub_date, pk, direction
+
+
+class CursorPage(Page):
+    """
+    Страница keyset-пагинации: без номера и без COUNT(*),
+    навигация только вперёд/назад по курсорам.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return "<Cursor page>"
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def start_index(self):
+        return None
+
+    def end_index(self):
+        return None
+
+
+def estimate_count(queryset):
+    """
+    Число строк таблицы по статистике СУБД, без COUNT(*). None, если
+    статистики нет (в SQLite она появляется после ANALYZE).
+    """
+    table = queryset.model._meta.db_table
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'table' AND name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 "
+                "WHERE tbl = %s ORDER BY idx IS NULL DESC LIMIT 1",
+                [table],
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+
+class WindowedPaginator(Paginator):
+    """
+    Paginator для длинных лент.
+
+    Навигация выводит окно номеров вокруг текущей страницы и края
+    диапазона, пропуски отмечены None (page.elided_page_range). Число
+    объектов кешируется на PAGINATOR_COUNT_TIMEOUT секунд и до любого
+    изменения постов. Если его уже знает таблица счётчиков, передаётся
+    count_hint. Для ленты без фильтров больше
+    PAGINATOR_APPROX_COUNT_THRESHOLD строк берётся оценка по статистике
+    таблицы.
+
+    Число может отставать или быть приблизительным, поэтому страница
+    выбирается без оглядки на него: на последней просто будет меньше
+    постов.
+    """
+
+    on_each_side = 2
+    on_ends = 1
+
+    def __init__(self, object_list, per_page, count_hint=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_hint = count_hint
+
+    @cached_property
+    def count(self):
+        if self.count_hint is not None:
+            return self.count_hint
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        query = str(self.object_list.order_by().query)
+        key = COUNT_KEY % hashlib.md5(
+            f"{generations(index_scopes())}:{query}".encode()
+        ).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self._estimate() or super().count
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def _estimate(self):
+        if self.object_list.query.where:
+            return None
+        estimate = estimate_count(self.object_list)
+        if estimate is None:
+            return None
+        if estimate < settings.PAGINATOR_APPROX_COUNT_THRESHOLD:
+            return None
+        return estimate
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if number == self.num_pages:
+            top += self.orphans
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+    def get_elided_page_range(self, number):
+        """Номера страниц вокруг number и по краям, None — пропуск."""
+        number = self.validate_number(number)
+        window = (self.on_each_side + self.on_ends) * 2
+        if self.num_pages <= window + 1:
+            yield from self.page_range
+            return
+        if number > 1 + self.on_each_side + self.on_ends + 1:
+            yield from range(1, self.on_ends + 1)
+            yield None
+            yield from range(number - self.on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - self.on_each_side - self.on_ends - 1:
+            yield from range(number + 1, number + self.on_each_side + 1)
+            yield None
+            yield from range(
+                self.num_pages - self.on_ends + 1, self.num_pages + 1
+            )
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.elided_page_range = list(
+            self.get_elided_page_range(page.number)
+        )
+        return page
+
+
+class CursorPaginator(WindowedPaginator):
+    """
+    Paginator с дополнительным keyset-режимом по (pub_date, id).
+    Обычный ?page= продолжает работать через OFFSET, а ?cursor=
+    выбирает страницу диапазонным запросом по индексу, так что
+    глубокая страница стоит столько же, сколько первая.
+    """
+
+    def __init__(self, object_list, per_page=SELECT_LIMIT, **kwargs):
+        if isinstance(object_list, QuerySet):
+            # Другие источники (posts.timeline.Timeline) уже упорядочены
+            object_list = object_list.order_by("-pub_date", "-id")
+        super().__init__(object_list, per_page, **kwargs)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        self.add_cursors(page)
+        return page
+
+    def add_cursors(self, page):
+        posts = list(page.object_list)
+        page.object_list = posts
+        page.next_cursor = None
+        page.previous_cursor = None
+        if posts and page.has_next():
+            page.next_cursor = encode_cursor(posts[-1], "next")
+        if posts and page.has_previous():
+            page.previous_cursor = encode_cursor(posts[0], "prev")
+
+    def get_cursor_page(self, token):
+        """Страница после/до позиции из токена; битый токен — первая."""
+        position = decode_cursor(token or "")
+        if position is None:
+            return self.get_page(1)
+        pub_date, pk, direction = position
+        posts = self.fetch(pub_date, pk, direction, self.per_page + 1)
+        has_more = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        if direction == "next":
+            has_next, has_previous = has_more, True
+        else:
+            posts.reverse()
+            has_next, has_previous = True, has_more
+        if not posts:
+            return self.get_page(1)
+        page = CursorPage(posts, self, has_next, has_previous)
+        page.next_cursor = (
+            encode_cursor(posts[-1], "next") if has_next else None
+        )
+        page.previous_cursor = (
+            encode_cursor(posts[0], "prev") if has_previous else None
+        )
+        return page
+
+    def fetch(self, pub_date, pk, direction, limit):
+        """
+        До limit постов за позицией в порядке обхода: для "next" от
+        новых к старым, для "prev" от старых к новым.
+        """
+        if direction == "next":
+            queryset = self.object_list.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            )
+        else:
+            queryset = self.object_list.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+            ).reverse()
+        return list(queryset[:limit])
+
+
+def comment_page(comments, token=None, limit=COMMENTS_LIMIT):
+    """
+    Порция комментариев после позиции (created, id) из токена, в
+    порядке публикации. Возвращает (комментарии, курсор следующей
+    порции или None). Без токена или с битым — с начала ветки.
+    """
+    position = decode_cursor(token) if token else None
+    if position is not None:
+        created, pk, _ = position
+        comments = comments.filter(
+            Q(created__gt=created) | Q(created=created, id__gt=pk)
+        )
+    batch = list(comments.order_by("created", "id")[:limit + 1])
+    if len(batch) <= limit:
+        return batch, None
+    batch = batch[:limit]
+    return batch, _encode(batch[-1].created, batch[-1].pk, "next")
@@ -0,0 +1,151 @@
+"""
+Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой SEARCH_BACKEND; по умолчанию это
+виртуальная таблица SQLite FTS5. Индекс обновляется сигналами
+(posts.signals) и хранит основы слов (posts.stemmer), поэтому
+«книги» находит «книгами».
+"""
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .stemmer import WORD_RE, stem, stem_text
+
+BATCH_SIZE = 500
+
+
+class BaseSearchBackend:
+    """Интерфейс поискового движка: индексирует и ищет id постов."""
+
+    def index(self, posts):
+        raise NotImplementedError
+
+    def remove(self, post_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, query, offset=0, limit=None):
+        """id постов, отсортированные по релевантности."""
+        raise NotImplementedError
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """Оставляет в queryset постов только найденные."""
+        return queryset.filter(pk__in=self.search(query))
+
+    def rebuild(self):
+        self.clear()
+        posts = Post.objects.only('pk', 'text').order_by('pk')
+        batch = []
+        for post in posts.iterator(chunk_size=BATCH_SIZE):
+            batch.append(post)
+            if len(batch) == BATCH_SIZE:
+                self.index(batch)
+                batch = []
+        self.index(batch)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    table = 'posts_post_fts'
+
+    def index(self, posts):
+        if not posts:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {self.table} (rowid, body) '
+                f'VALUES (%s, %s)',
+                [(post.pk, stem_text(post.text)) for post in posts],
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(post_id,) for post_id in post_ids],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    @staticmethod
+    def match_expression(query):
+        """Каждое слово запроса — префикс основы, все слова обязательны."""
+        return ' '.join(
+            f'"{stem(word)}"*' for word in WORD_RE.findall(query.lower())
+        )
+
+    def search(self, query, offset=0, limit=None):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} '
+                f'MATCH %s ORDER BY rank LIMIT %s OFFSET %s',
+                [expression, -1 if limit is None else limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def count(self, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s',
+                [expression],
+            )
+            return cursor.fetchone()[0]
+
+    def filter(self, queryset, query):
+        # Подзапрос вместо списка id: совпадений может быть больше,
+        # чем SQLite принимает параметров
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset.none()
+        return queryset.extra(
+            where=[
+                f'{Post._meta.db_table}.id IN (SELECT rowid FROM '
+                f'{self.table} WHERE {self.table} MATCH %s)'
+            ],
+            params=[expression],
+        )
+
+
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+class SearchResults:
+    """
+    Ленивая выдача для Paginator: считает и выбирает только
+    запрошенную страницу, посты догружаются одним запросом.
+    """
+
+    def __init__(self, query, backend=None):
+        self.query = query
+        self.backend = backend or get_backend()
+
+    def count(self):
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        limit = None if item.stop is None else item.stop - start
+        ids = self.backend.search(self.query, offset=start, limit=limit)
+        posts = Post.objects.for_listing().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
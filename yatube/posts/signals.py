@@ -0,0 +1,189 @@
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import counters, page_cache, search, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.follow(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.unfollow(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counter(instance.author_id, 'followers_count', 1)
+        counters.change_user_counter(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_scopes(sender, instance, **kwargs):
+    """Страницы, на которых пост был до редактирования, и его картинка."""
+    instance._cache_scopes = []
+    instance._old_image = None
+    if instance.pk is not None:
+        old = Post.objects.filter(pk=instance.pk).select_related(
+            'author', 'group'
+        ).first()
+        if old is not None:
+            instance._cache_scopes = page_cache.post_page_scopes(old)
+            instance._old_image = old.image.name
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    scopes = set(getattr(instance, '_cache_scopes', []))
+    scopes.update(page_cache.post_page_scopes(instance))
+    page_cache.bump(*scopes)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._old_slug = Group.objects.filter(
+        pk=instance.pk
+    ).values_list('slug', flat=True).first()
+
+
+@receiver(pre_save, sender=Post)
+def bump_post_version(sender, instance, **kwargs):
+    """
+    Версия растёт в самом UPDATE: значение из памяти затёрло бы сброс,
+    сделанный после загрузки поста (например, posts.thumbnails).
+    """
+    if instance.pk is not None:
+        instance.version = F('version') + 1
+
+
+@receiver(post_save, sender=Post)
+def refresh_post_version(sender, instance, created, **kwargs):
+    if not created:
+        instance.refresh_from_db(fields=['version'])
+
+
+@receiver(post_save, sender=Group)
+def bump_group_post_versions(sender, instance, created, **kwargs):
+    if not created:
+        instance.posts.bump_version()
+
+
+@receiver(pre_delete, sender=Group)
+def bump_deleted_group_post_versions(sender, instance, **kwargs):
+    """Посты теряют группу обновлением без сигналов (SET_NULL)."""
+    instance.posts.bump_version()
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._old_username = User.objects.filter(
+        pk=instance.pk
+    ).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def bump_author_post_versions(sender, instance, created, update_fields,
+                              **kwargs):
+    """Карточка выводит имя автора; вход на сайт её не меняет."""
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    instance.posts.bump_version()
+    slugs = Group.objects.filter(
+        posts__author=instance
+    ).values_list('slug', flat=True).distinct()
+    usernames = {instance.username, getattr(instance, '_old_username', None)}
+    page_cache.bump(
+        'posts',
+        *(f'profile:{name}' for name in usernames if name is not None),
+        *(f'group:{slug}' for slug in slugs),
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    slugs = {instance.slug, getattr(instance, '_old_slug', None)}
+    page_cache.bump(
+        'posts', *(f'group:{slug}' for slug in slugs if slug is not None)
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    page_cache.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    page_cache.bump(
+        f'profile:{instance.user.username}',
+        f'profile:{instance.author.username}',
+    )
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.get_backend().index([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, **kwargs):
+    old = getattr(instance, '_old_image', None)
+    if old and old != instance.image.name:
+        thumbnails.release(old)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        thumbnails.release(instance.image.name)
@@ -0,0 +1,138 @@
+"""
+Стеммер русского языка по алгоритму Snowball (Портера):
+https://snowballstem.org/algorithms/russian/stemmer.html
+
+В FTS5 встроен только английский porter, поэтому поисковый индекс
+(posts.search) хранит и ищет уже обрезанные до основы слова.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+)
+SUPERLATIVE = ('ейш', 'ейше')
+DERIVATIONAL = ('ост', 'ость')
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _regions(word):
+    """Начала областей RV и R2."""
+    rv = r1 = r2 = len(word)
+    for i, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _longest(word, start, endings):
+    """Самое длинное окончание из списка, целиком лежащее в word[start:]."""
+    region = word[start:]
+    found = [ending for ending in endings if region.endswith(ending)]
+    return max(found, key=len, default=None)
+
+
+def _remove(word, start, endings):
+    ending = _longest(word, start, endings)
+    if ending is None:
+        return word, False
+    return word[:-len(ending)], True
+
+
+def _remove_grouped(word, start, groups):
+    """
+    Первая группа окончаний снимается только после «а» или «я»,
+    которые сами остаются в слове.
+    """
+    first, second = groups
+    ending_1 = _longest(word, start + 1, first)
+    if ending_1 and word[-len(ending_1) - 1] not in 'ая':
+        ending_1 = None
+    ending_2 = _longest(word, start, second)
+    ending = max((ending_1, ending_2), key=lambda e: len(e or ''))
+    if ending is None:
+        return word, False
+    return word[:-len(ending)], True
+
+
+def _remove_adjectival(word, start):
+    word, found = _remove(word, start, ADJECTIVE)
+    if found:
+        word, _ = _remove_grouped(word, start, PARTICIPLE)
+    return word, found
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1
+    word, found = _remove_grouped(word, rv, PERFECTIVE_GERUND)
+    if not found:
+        word, _ = _remove(word, rv, REFLEXIVE)
+        for remove in (
+            lambda w: _remove_adjectival(w, rv),
+            lambda w: _remove_grouped(w, rv, VERB),
+            lambda w: _remove(w, rv, NOUN),
+        ):
+            word, found = remove(word)
+            if found:
+                break
+    # Шаг 2
+    if word[rv:].endswith('и'):
+        word = word[:-1]
+    # Шаг 3
+    word, _ = _remove(word, max(r2, rv), DERIVATIONAL)
+    # Шаг 4
+    word, found = _remove(word, rv, SUPERLATIVE)
+    if word[rv:].endswith('нн'):
+        word = word[:-1]
+    elif not found and word[rv:].endswith('ь'):
+        word = word[:-1]
+    return word
+
+
+def stem_text(text):
+    """Текст как строка основ слов через пробел."""
+    return ' '.join(stem(word) for word in WORD_RE.findall(text.lower()))
@@ -4,6 +4,8 @@ from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.core.cache import cache
+from io import BytesIO
+from PIL import Image
 import tempfile
 import shutil
 
@@ -79,3 +81,84 @@ class PostCreateFormTests(TestCase):
                 text=self.post.text * 3,
             ).exists()
         )
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_create_post_with_image_makes_thumbnails(self):
+        """Миниатюры считаются при сохранении, шаблон их только читает."""
+        image_file = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(image_file, 'png')
+        image = SimpleUploadedFile(
+            'big.png', image_file.getvalue(), content_type='image/png'
+        )
+        self.authorized_client.post(
+            reverse("posts:create_post"),
+            data={"text": "с картинкой", "image": image},
+        )
+        post = Post.objects.get(text="с картинкой")
+
+        sizes = {
+            thumbnail.name: (thumbnail.width, thumbnail.height)
+            for thumbnail in post.thumbnails.all()
+        }
+        self.assertEqual(sizes, {'card': (100, 100), 'detail': (960, 339)})
+        response = self.authorized_client.get(
+            reverse("posts:post_detail", kwargs={"post_id": post.id})
+        )
+        self.assertContains(response, post.detail_thumbnail.url)
+
+    @override_settings(THUMBNAIL_WORKERS=0, IMAGE_MAX_SIZE=(400, 400))
+    def test_uploaded_image_is_optimized(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет его."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90°
+        image_file = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(
+            image_file, 'jpeg', exif=exif.tobytes()
+        )
+        image = SimpleUploadedFile(
+            'photo.jpeg', image_file.getvalue(), content_type='image/jpeg'
+        )
+        self.authorized_client.post(
+            reverse("posts:post_edit", kwargs={"post_id": self.post.id}),
+            data={"text": "фото", "image": image},
+        )
+        self.post.refresh_from_db()
+
+        self.assertTrue(self.post.image.name.endswith('.jpg'))
+        with Image.open(self.post.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(stored.size, (267, 400))
+            self.assertNotIn('exif', stored.info)
+
+    def test_transparent_image_stays_png(self):
+        image_file = BytesIO()
+        Image.new('RGBA', (50, 50), (255, 0, 0, 128)).save(image_file, 'png')
+        image = SimpleUploadedFile(
+            'logo.png', image_file.getvalue(), content_type='image/png'
+        )
+        self.authorized_client.post(
+            reverse("posts:create_post"),
+            data={"text": "логотип", "image": image},
+        )
+        post = Post.objects.get(text="логотип")
+
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'PNG')
+            self.assertEqual(stored.mode, 'RGBA')
+
+    def test_truncated_image_is_form_error(self):
+        image_file = BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(image_file, 'jpeg')
+        data = image_file.getvalue()
+        image = SimpleUploadedFile(
+            'broken.jpg', data[:len(data) // 2], content_type='image/jpeg'
+        )
+        response = self.authorized_client.post(
+            reverse("posts:create_post"),
+            data={"text": "обрыв", "image": image},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response, "form", "image", "Файл картинки повреждён"
+        )
+        self.assertFalse(Post.objects.filter(text="обрыв").exists())
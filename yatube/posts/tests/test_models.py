@@ -1,7 +1,23 @@
+import csv
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
 
-from ..models import Post, Group
+from ..counters import user_stats
+from ..export import FIELDS
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserStats,
+)
+from ..search import get_backend
 
 User = get_user_model()
 
@@ -20,3 +36,287 @@ class PostModelTest(TestCase):
         """У моделей метод __str__ выводит первые 15 символов."""
         group = Group.objects.create(slug="slug", title='title')
         self.assertEqual(str(group), 'title')
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.reader = User.objects.create_user('reader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='пост')
+        Post.objects.create(author=self.author, text='пост')
+        Comment.objects.create(post=post, author=self.reader, text='текст')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        self.assertEqual(user_stats(self.author).posts_count, 2)
+        self.assertEqual(user_stats(self.author).followers_count, 1)
+        self.assertEqual(user_stats(self.reader).following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+        post.delete()
+        Follow.objects.all().delete()
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 0)
+
+    def test_recount_repairs_drift(self):
+        post = Post.objects.create(author=self.author, text='пост')
+        Comment.objects.create(post=post, author=self.reader, text='текст')
+        UserStats.objects.update(posts_count=42)
+        Post.objects.update(comment_count=42)
+
+        call_command('recount', stdout=StringIO())
+
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+
+class ExplainViewsTest(TestCase):
+    def test_listings_use_composite_indexes(self):
+        author = User.objects.create_user('author')
+        group = Group.objects.create(slug='slug', title='группа')
+        post = Post.objects.create(author=author, group=group, text='пост')
+        Comment.objects.create(post=post, author=author, text='текст')
+        other = User.objects.create_user('other')
+        Follow.objects.create(user=author, author=other)
+        Post.objects.create(author=other, text='пост')
+        output = StringIO()
+
+        call_command('explain_views', stdout=output)
+
+        for index in ('post_author_pub_date_idx', 'post_group_pub_date_idx',
+                      'comment_post_created_idx',
+                      'timeline_user_pub_date_idx'):
+            with self.subTest(index=index):
+                self.assertIn(index, output.getvalue())
+        timeline = output.getvalue().split('follow_index')[1]
+        self.assertNotIn('TEMP B-TREE', timeline.split('group_list')[0])
+
+
+class ExportPostsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        cls.group = Group.objects.create(slug='slug', title='группа')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='пост'
+        )
+        Post.objects.create(author=cls.reader, text='чужой пост')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='ок')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, *args):
+        output = StringIO()
+        call_command('export_posts', *args, stdout=output)
+        return output.getvalue()
+
+    def test_ndjson_exports_all_models(self):
+        records = [
+            json.loads(line) for line in self.export().splitlines()
+        ]
+        self.assertEqual(
+            [record['model'] for record in records],
+            ['group', 'post', 'post', 'comment', 'follow'],
+        )
+        self.assertEqual(records[1]['author'], 'author')
+        self.assertEqual(records[1]['group'], 'slug')
+        self.assertEqual(records[3]['post'], self.post.pk)
+        self.assertEqual(records[4], {
+            'model': 'follow', 'user': 'reader', 'author': 'author',
+        })
+
+    def test_filter_by_author(self):
+        records = [
+            json.loads(line)
+            for line in self.export('--author', 'reader').splitlines()
+        ]
+        posts = [record for record in records if record['model'] == 'post']
+        self.assertEqual([post['text'] for post in posts], ['чужой пост'])
+        self.assertFalse(
+            [record for record in records if record['model'] == 'comment']
+        )
+
+    def test_filter_by_period(self):
+        output = self.export('--model', 'post', '--until', '2000-01-01')
+        self.assertEqual(output, '')
+
+    def test_csv_needs_single_model(self):
+        with self.assertRaises(CommandError):
+            self.export('--format', 'csv')
+        rows = list(csv.reader(StringIO(
+            self.export('--format', 'csv', '--model', 'post')
+        )))
+        self.assertEqual(rows[0], list(FIELDS['post']))
+        self.assertEqual(len(rows), 3)
+
+
+class ImportPostsTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author')
+        reader = User.objects.create_user('reader')
+        group = Group.objects.create(slug='slug', title='группа')
+        post = Post.objects.create(author=author, group=group, text='книга')
+        Comment.objects.create(post=post, author=reader, text='ок')
+        Follow.objects.create(user=reader, author=author)
+        self.pub_date = post.pub_date
+        output = StringIO()
+        call_command('export_posts', stdout=output)
+        self.dump = output.getvalue()
+        for model in (Post, Group, User):
+            model.objects.all().delete()
+
+    def load(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as dump:
+            dump.write(self.dump)
+            dump.flush()
+            call_command('import_posts', dump.name, stdout=StringIO())
+
+    def test_import_restores_data(self):
+        self.load()
+        post = Post.objects.get()
+        self.assertEqual(post.pub_date, self.pub_date)
+        self.assertEqual(post.group.slug, 'slug')
+        self.assertEqual(post.comment_count, 1)
+        self.assertTrue(
+            Follow.objects.filter(
+                user__username='reader', author__username='author'
+            ).exists()
+        )
+        self.assertEqual(user_stats(post.author).followers_count, 1)
+        self.assertEqual(
+            list(get_backend().search('книгами')), [post.pk]
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(post=post).count(), 1
+        )
+
+    def test_posts_with_same_author_and_date_kept_apart(self):
+        """Разные посты с одной датой не сливаются, комментарии целы."""
+        records = [json.loads(line) for line in self.dump.splitlines()]
+        post = next(r for r in records if r['model'] == 'post')
+        comment = next(r for r in records if r['model'] == 'comment')
+        twin = dict(post, id=post['id'] + 1, text='другая книга')
+        records.insert(records.index(post) + 1, twin)
+        records.append(dict(comment, post=twin['id'], text='тоже ок'))
+        self.dump = '\n'.join(json.dumps(r) for r in records)
+
+        self.load()
+        self.load()
+
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', 'comment_count')),
+            [('другая книга', 1), ('книга', 1)],
+        )
+
+    def test_import_survives_missing_image(self):
+        """Битая картинка не мешает пересборке после загрузки."""
+        self.dump = self.dump.replace(
+            '"image": ""', '"image": "posts/missing.jpg"'
+        )
+        self.assertIn('missing.jpg', self.dump)
+        with self.assertLogs('posts.thumbnails', 'WARNING'):
+            self.load()
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/missing.jpg')
+        self.assertEqual(post.thumbnails.count(), 0)
+        self.assertEqual(post.comment_count, 1)
+
+    def test_import_is_idempotent(self):
+        self.load()
+        self.load()
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(Group.objects.count(), 1)
+
+
+class PostVersionTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.group = Group.objects.create(slug='slug', title='группа')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='пост'
+        )
+
+    def version(self):
+        return Post.objects.values_list('version', flat=True).get()
+
+    def test_version_follows_card_changes(self):
+        changes = {
+            'правка поста': lambda: self.post.save(),
+            'переименование группы': lambda: self.group.save(),
+            'новое имя автора': lambda: self.author.save(),
+        }
+        for name, change in changes.items():
+            with self.subTest(change=name):
+                before = self.version()
+                change()
+                self.assertEqual(self.version(), before + 1)
+
+    def test_save_keeps_concurrent_bump(self):
+        post = Post.objects.get()
+        # Миниатюры посчитались, пока пост был открыт на правку
+        Post.objects.all().bump_version()
+        post.text = 'правка'
+        post.save()
+        self.assertEqual(self.version(), 3)
+        self.assertEqual(post.version, 3)
+
+    def test_login_keeps_version(self):
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(self.version(), 1)
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(), THUMBNAIL_WORKERS=0, MEDIA_GRACE=0
+)
+class ImageStorageTest(TransactionTestCase):
+    def setUp(self):
+        self.addCleanup(
+            shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True
+        )
+        self.author = User.objects.create_user('author')
+
+    def image(self, color):
+        image_file = BytesIO()
+        Image.new('RGB', (10, 10), color).save(image_file, 'png')
+        return ContentFile(image_file.getvalue(), name='image.png')
+
+    def post(self, color):
+        post = Post(author=self.author, text='пост')
+        post.image.save('image.png', self.image(color))
+        return post
+
+    def test_same_image_is_stored_once(self):
+        first, second = self.post('red'), self.post('red')
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        self.assertEqual(storage.references(first.image.name), 2)
+
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+
+    def test_replaced_image_is_released(self):
+        post = self.post('red')
+        old = post.image.name
+        post.image.save('image.png', self.image('blue'))
+        self.assertNotEqual(post.image.name, old)
+        self.assertFalse(post.image.storage.exists(old))
+
+    def test_collect_media_removes_orphans(self):
+        post = self.post('red')
+        orphan = post.image.storage.save('posts/x.png', self.image('blue'))
+        out = StringIO()
+        call_command('collect_media', grace=0, stdout=out)
+        self.assertIn('Картинок удалено: 1', out.getvalue())
+        self.assertFalse(post.image.storage.exists(orphan))
+        self.assertTrue(post.image.storage.exists(post.image.name))
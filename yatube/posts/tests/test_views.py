@@ -1,13 +1,22 @@
+import gzip
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from core import compression, fragments
+
+from .. import page_cache
 from ..forms import PostForm
 
-from ..models import Comment, Group, Post
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+from ..pagination import COMMENTS_LIMIT, WindowedPaginator
 
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 User = get_user_model()
@@ -294,6 +303,143 @@ class PaginatorViewsTest(TestCase):
             "posts:profile", kwargs={"username": self.user.get_username()}
         )
 
+    def test_cursor_paginator(self):
+        """Курсоры ведут на следующую и обратно на первую страницу."""
+        response = self.authorized_client.get(reverse("posts:index"))
+        first_page = response.context["page_obj"]
+        response = self.authorized_client.get(
+            reverse("posts:index") + f"?cursor={first_page.next_cursor}"
+        )
+        second_page = response.context["page_obj"]
+        self.assertEqual(len(second_page), self.SECOND_PAGE_POSTS_COUNT)
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(second_page[0].pk, self.posts[1].pk)
+
+        response = self.authorized_client.get(
+            reverse("posts:index") + f"?cursor={second_page.previous_cursor}"
+        )
+        self.assertEqual(
+            [post.pk for post in response.context["page_obj"]],
+            [post.pk for post in first_page],
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.authorized_client.get(
+            reverse("posts:index") + "?cursor=broken"
+        )
+        self.assertEqual(
+            len(response.context["page_obj"]), self.FIRST_PAGE_POSTS_COUNT
+        )
+
+
+class WindowedPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("auth")
+        Post.objects.bulk_create(
+            Post(author=cls.user, text="пост") for _ in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_elided_page_range(self):
+        paginator = WindowedPaginator(range(1000), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, None, 48, 49, 50, 51, 52, None, 100],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(2)),
+            [1, 2, 3, 4, None, 100],
+        )
+        self.assertEqual(
+            list(WindowedPaginator(range(50), 10).get_elided_page_range(1)),
+            [1, 2, 3, 4, 5],
+        )
+
+    def test_count_hint_skips_count_query(self):
+        paginator = WindowedPaginator(
+            Post.objects.order_by("id"), 10, count_hint=3
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 3)
+
+    def test_count_is_cached(self):
+        WindowedPaginator(Post.objects.order_by("id"), 10).count
+        Post.objects.filter(text="пост").update(text="без сигналов")
+        with self.assertNumQueries(0):
+            WindowedPaginator(Post.objects.order_by("id"), 10).count
+
+    @override_settings(PAGINATOR_APPROX_COUNT_THRESHOLD=1)
+    def test_large_table_uses_statistics(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        Post.objects.first().delete()
+        # Статистика ещё помнит три поста
+        self.assertEqual(
+            WindowedPaginator(Post.objects.order_by("id"), 10).count, 3
+        )
+        self.assertEqual(
+            WindowedPaginator(
+                Post.objects.filter(text="пост").order_by("id"), 10
+            ).count,
+            2,
+        )
+
+
+class CommentThreadTests(TestCase):
+    COMMENTS_COUNT = COMMENTS_LIMIT + 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("auth")
+        cls.post = Post.objects.create(author=cls.user, text="пост")
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f"комментарий {i}")
+            for i in range(cls.COMMENTS_COUNT)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_render_is_bounded(self):
+        response = self.client.get(
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        )
+        self.assertEqual(len(response.context["comments"]), COMMENTS_LIMIT)
+        self.assertIsNotNone(response.context["comments_cursor"])
+        self.assertContains(response, "Показать ещё")
+
+    def test_load_more_returns_rest(self):
+        detail = self.client.get(
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        )
+        url = reverse(
+            "posts:post_comments", kwargs={"post_id": self.post.id}
+        )
+        cursor = detail.context["comments_cursor"]
+        response = self.client.get(url, {"cursor": cursor})
+        self.assertEqual(len(response.context["comments"]), 5)
+        self.assertNotContains(response, "Показать ещё")
+        self.assertContains(response, f"комментарий {COMMENTS_LIMIT}")
+
+        data = self.client.get(
+            url, {"cursor": cursor, "format": "json"}
+        ).json()
+        self.assertIsNone(data["next_cursor"])
+        self.assertEqual(
+            [comment["text"] for comment in data["comments"]],
+            [f"комментарий {i}"
+             for i in range(COMMENTS_LIMIT, self.COMMENTS_COUNT)],
+        )
+
+    def test_unknown_post(self):
+        response = self.client.get(
+            reverse("posts:post_comments", kwargs={"post_id": 404})
+        )
+        self.assertEqual(response.status_code, 404)
+
 
 class ImagePostPageTests(TestCase):
     def setUp(self):
@@ -384,21 +530,295 @@ class CacheTests(TestCase):
         """
         Проверяем, что на главной странице используется кеш.
         """
-        post = Post.objects.create(
-            author=self.author,
-        )
-
-        response_predelete = self.client.get(reverse('posts:index'))
-        post.delete()
-        response_afterdelete = self.client.get(reverse('posts:index'))
-        self.assertEqual(response_predelete.content,
-                         response_afterdelete.content)
+        response = self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='без сигналов')
+        response_cached = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.content, response_cached.content)
 
         cache.clear()
         response_after_clear_cash = self.client.get(reverse('posts:index'))
-        self.assertNotEqual(response_afterdelete.content,
+        self.assertNotEqual(response_cached.content,
                             response_after_clear_cash.content)
 
+    def test_index_page_cache_invalidated_on_change(self):
+        """Новый и удалённый пост сразу видны на закешированной странице."""
+        response = self.client.get(reverse('posts:index'))
+        post = Post.objects.create(author=self.author, text='новый пост')
+        response_after_create = self.client.get(reverse('posts:index'))
+        self.assertNotEqual(response.content, response_after_create.content)
+        self.assertContains(response_after_create, 'новый пост')
+
+        post.delete()
+        response_after_delete = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response_after_delete, 'новый пост')
+
+    def test_bump_from_other_worker_seen_at_once(self):
+        """Поколения не оседают в памяти процесса."""
+        self.client.get(reverse('posts:index'))
+        # Сигналы не срабатывают, сброс делает другой воркер
+        Post.objects.bulk_create(
+            [Post(author=self.author, text='другой воркер')]
+        )
+        caches['shared'].incr(page_cache.GENERATION_KEY % 'posts')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'другой воркер')
+
+    def test_renamed_author_old_profile_gone(self):
+        old_url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertEqual(self.client.get(old_url).status_code, 200)
+
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'writer'
+        author.save()
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'writer'})
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_invalidates_post_page(self):
+        self.author_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        Comment.objects.create(
+            post=self.post, author=self.author, text='комментарий'
+        )
+        response = self.author_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertContains(response, 'комментарий')
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='первая версия'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def refresh_index(self):
+        # Новая страница, но те же карточки
+        page_cache.bump(*page_cache.index_scopes())
+        return self.client.get(reverse('posts:index'))
+
+    def test_card_is_reused_until_version_changes(self):
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='без сигналов')
+        response = self.refresh_index()
+        self.assertContains(response, 'первая версия')
+        self.assertNotContains(response, 'без сигналов')
+
+        Post.objects.filter(pk=self.post.pk).bump_version()
+        response = self.refresh_index()
+        self.assertContains(response, 'без сигналов')
+        self.assertNotContains(response, 'первая версия')
+
+    def test_group_delete_updates_card(self):
+        group = Group.objects.create(title='группа', slug='g')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        Post.objects.filter(pk=self.post.pk).bump_version()
+        group_url = reverse('posts:group_list', kwargs={'slug': 'g'})
+        self.assertContains(self.refresh_index(), group_url)
+
+        group.delete()
+        self.assertNotContains(self.refresh_index(), group_url)
+
+    def test_author_rename_updates_card(self):
+        self.client.get(reverse('posts:index'))
+        self.author.first_name = 'Лев'
+        self.author.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Лев')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='пост')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_etag_not_modified(self):
+        """С тем же ETag страница не рендерится заново."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                # Первый ответ может выставить csrf-куку, от неё
+                # зависит ETag
+                self.author_client.get(url)
+                etag = self.author_client.get(url)['ETag']
+                response = self.author_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+                self.assertEqual(response.content, b'')
+
+    def test_etag_changes_with_content(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_for_anonymous(self):
+        url = reverse('posts:index')
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_bump_in_same_second_changes_last_modified(self):
+        url = reverse('posts:index')
+        with mock.patch('posts.page_cache.time.time', return_value=1000.2):
+            last_modified = self.client.get(url)['Last-Modified']
+            page_cache.bump(*page_cache.index_scopes())
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+
+class SharedPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='slug')
+        cls.post = Post.objects.create(
+            author=cls.author, text='пост', group=group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_one_cached_page_for_everyone(self):
+        """Страницу рендерит только первый посетитель, гость или нет."""
+        pages = {
+            reverse('posts:index'): 'posts/index.html',
+            reverse('posts:group_list', kwargs={'slug': 'slug'}):
+                'posts/group_list.html',
+            reverse('posts:profile', kwargs={'username': 'author'}):
+                'posts/profile.html',
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}):
+                'posts/post_detail.html',
+        }
+        for url, template in pages.items():
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                response = self.reader_client.get(url)
+                # Рендерятся только частички пользователя
+                self.assertTemplateNotUsed(response, template)
+                self.assertTemplateNotUsed(response, 'base.html')
+                self.assertIn('Cookie', response['Vary'])
+                self.assertContains(response, 'Пользователь: reader')
+                self.assertNotContains(response, '<!--fragment:')
+                self.assertNotContains(first, 'Пользователь:')
+
+    def test_user_fragments(self):
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertContains(self.client.get(url), 'Подписаться')
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'Отписаться')
+
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.assertNotContains(self.client.get(url), 'csrfmiddlewaretoken')
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_comment_cannot_forge_fragment(self):
+        """Метка в тексте комментария остаётся текстом."""
+        for text in ('<!--fragment:nope?-->', '<!--fragment:user_nav?-->'):
+            Comment.objects.create(
+                post=self.post, author=self.reader, text=text
+            )
+        url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.id}
+        )
+        response = self.reader_client.get(url, {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        texts = [comment['text'] for comment in response.json()['comments']]
+        self.assertIn('<!--fragment:user_nav?-->', texts)
+        self.assertNotContains(response, 'Пользователь:')
+
+        response = self.reader_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Пользователь:')
+
+    def test_unknown_fragment_is_blank(self):
+        self.assertEqual(fragments.render(None, 'nope'), '')
+
+    def test_gzip_assembled_from_cached_chunks(self):
+        url = reverse('posts:index')
+        plain = self.reader_client.get(url).content
+        # Целиком страница не пережимается
+        with mock.patch.object(
+            compression, '_gzip', side_effect=AssertionError
+        ):
+            response = self.reader_client.get(
+                url, HTTP_ACCEPT_ENCODING='gzip'
+            )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain)
+
+
+class ExportViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(author=cls.user, text='пост')
+
+    def test_export_only_for_staff(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_streams_ndjson(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse('posts:export'), {'model': 'post'}
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8'
+        )
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('"text": "пост"', body)
+
+    def test_export_bad_params(self):
+        self.client.force_login(self.staff)
+        for params in ({'format': 'xml'}, {'format': 'csv'},
+                       {'since': 'вчера'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('posts:export'), params)
+                self.assertEqual(response.status_code, 400)
+
 
 class FolowingTests(TestCase):
     def setUp(self):
@@ -476,3 +896,141 @@ class FolowingTests(TestCase):
             reverse('posts:follow_index')
         )
         self.assertTrue(not [*response.context.get('page_obj')])
+
+    def test_timeline_filled_on_follow_and_post(self):
+        """Лента подписок заполняется при подписке и публикации."""
+        Follow.objects.create(user=self.user, author=self.other_user)
+        new_post = Post.objects.create(author=self.other_user)
+        self.assertEqual(
+            set(self.user.timeline.values_list('post_id', flat=True)),
+            {self.other_user_post.pk, new_post.pk},
+        )
+
+        Follow.objects.filter(user=self.user).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_posts_read_on_request(self):
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.user, author=self.other_user)
+        Post.objects.create(author=self.other_user)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        response = self.user_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_timeline_cursor_merges_popular_author(self):
+        """Курсоры ленты проходят и записи, и посты популярного автора."""
+        popular = User.objects.create_user(username='popular')
+        Follow.objects.create(user=self.emptyfollow_user, author=popular)
+        Follow.objects.create(user=self.user, author=popular)
+        Follow.objects.create(user=self.user, author=self.other_user)
+        for index in range(12):
+            Post.objects.create(
+                author=popular if index % 2 else self.other_user,
+                text=f'пост {index}',
+            )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=popular).exists()
+        )
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+        seen = []
+        response = self.user_client.get(reverse('posts:follow_index'))
+        while True:
+            page = response.context['page_obj']
+            seen.extend(page)
+            if not page.next_cursor:
+                break
+            response = self.user_client.get(
+                reverse('posts:follow_index'), {'cursor': page.next_cursor}
+            )
+        self.assertEqual(seen, expected)
+
+        response = self.user_client.get(
+            reverse('posts:follow_index'), {'cursor': page.previous_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']), expected[:10])
+
+
+class ListingQueriesTests(TestCase):
+    """Число запросов к БД не зависит от числа постов на странице."""
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.group = Group.objects.create(title='группа', slug='slug')
+        self.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='пост'
+        )
+        self.create_posts(1)
+
+    def create_posts(self, count):
+        for _ in range(count):
+            author = User.objects.create_user(
+                username=f'user-{User.objects.count()}'
+            )
+            Follow.objects.create(user=self.reader, author=author)
+            Post.objects.create(author=author, group=self.group, text='пост')
+            Comment.objects.create(post=self.post, author=author)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.reader_client.get(url)
+        return len(context)
+
+    def test_listing_queries_constant(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        few = {url: self.count_queries(url) for url in urls}
+        self.create_posts(9)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), few[url])
+
+
+class SearchViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='author')
+        self.post = Post.objects.create(
+            author=self.user, text='Читаю интересные книги по вечерам'
+        )
+        Post.objects.create(author=self.user, text='Про погоду')
+        cache.clear()
+
+    def test_search_finds_word_forms(self):
+        """Поиск находит пост по другой форме слова."""
+        response = self.client.get(reverse('posts:search'), {'q': 'книгами'})
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+
+    def test_search_index_follows_edits_and_deletes(self):
+        self.post.text = 'Теперь про кино'
+        self.post.save()
+        response = self.client.get(reverse('posts:search'), {'q': 'книга'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+        response = self.client.get(reverse('posts:search'), {'q': 'кино'})
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        self.post.delete()
+        response = self.client.get(reverse('posts:search'), {'q': 'кино'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_search_results_paginated(self):
+        for _ in range(12):
+            Post.objects.create(author=self.user, text='книга')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'книга', 'page': 2}
+        )
+        self.assertEqual(len(response.context['page_obj']), 3)
+        self.assertContains(
+            response, 'q=%D0%BA%D0%BD%D0%B8%D0%B3%D0%B0&page=1'
+        )
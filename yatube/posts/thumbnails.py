@@ -0,0 +1,149 @@
+"""
+Миниатюры картинок постов считаются в фоновых потоках сразу после
+сохранения поста, а шаблоны только читают готовые Thumbnail.
+Пока миниатюры нет, шаблон показывает оригинал, уменьшенный браузером.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from sorl.thumbnail import delete, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from . import page_cache
+from .models import Post, Thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Размеры, которые выводят post_card.html и post_detail.html
+RENDITIONS = {
+    'card': ('100x100', {'crop': 'center'}),
+    'detail': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def generate(post):
+    """
+    Считает все миниатюры поста; старые удаляются. Возвращает False,
+    если картинки нет или её файл не найден.
+    """
+    Thumbnail.objects.filter(post=post).delete()
+    if not post.image:
+        return False
+    if not post.image.storage.exists(post.image.name):
+        logger.warning(
+            'Нет файла картинки поста %s: %s', post.pk, post.image.name
+        )
+        return False
+    Thumbnail.objects.bulk_create(
+        Thumbnail(
+            post=post,
+            name=name,
+            path=image.name,
+            width=image.width,
+            height=image.height,
+        )
+        for name, image in (
+            (name, get_thumbnail(post.image, geometry, **options))
+            for name, (geometry, options) in RENDITIONS.items()
+        )
+    )
+    # Карточки и страницы с постом должны показать миниатюру
+    Post.objects.filter(pk=post.pk).bump_version()
+    page_cache.bump(*page_cache.post_page_scopes(post))
+    return True
+
+
+def generate_missing(regenerate=False):
+    """
+    Считает миниатюры постов, у которых их нет или не хватает; при
+    regenerate — у всех постов с картинкой. Возвращает число постов,
+    для которых миниатюры посчитаны; битые картинки пропускаются.
+    """
+    posts = Post.objects.exclude(image='')
+    if not regenerate:
+        posts = posts.annotate(
+            renditions=Count('thumbnails')
+        ).filter(renditions__lt=len(RENDITIONS))
+    done = 0
+    for post in posts.iterator(chunk_size=500):
+        try:
+            done += generate(post)
+        except Exception:
+            logger.exception(
+                'Не удалось посчитать миниатюры поста %s', post.pk
+            )
+    return done
+
+
+def _generate_in_worker(post_id):
+    close_old_connections()
+    try:
+        post = Post.objects.filter(pk=post_id).first()
+        if post is not None:
+            generate(post)
+    except Exception:
+        logger.exception('Не удалось посчитать миниатюры поста %s', post_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(post):
+    """
+    Ставит расчёт миниатюр в очередь после коммита. При
+    THUMBNAIL_WORKERS = 0 считает сразу, в текущем потоке.
+    """
+    Thumbnail.objects.filter(post=post).delete()
+    if not settings.THUMBNAIL_WORKERS:
+        generate(post)
+        return
+    post_id = post.pk
+    transaction.on_commit(
+        lambda: get_executor().submit(_generate_in_worker, post_id)
+    )
+
+
+def _image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def _release(name):
+    storage = _image_storage()
+    if storage.release(name, settings.MEDIA_GRACE):
+        # Файлы миниатюр sorl и их записи удаляются вместе с картинкой
+        delete(ImageFile(name, storage), delete_file=False)
+
+
+def release(name):
+    """
+    Удаляет картинку и её миниатюры после коммита, если ни один пост
+    на неё больше не ссылается (одинаковые картинки — один файл).
+    """
+    transaction.on_commit(lambda: _release(name))
+
+
+def collect_garbage(grace):
+    """
+    Удаляет картинки без ссылок старше grace секунд, например
+    оставшиеся после отката транзакции. Возвращает их число.
+    """
+    storage = _image_storage()
+    removed = 0
+    for name in storage.orphans(grace):
+        delete(ImageFile(name, storage))
+        removed += 1
+    return removed
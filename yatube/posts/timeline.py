@@ -0,0 +1,164 @@
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Follow, Post, TimelineEntry, User
+from .pagination import CursorPaginator
+
+BATCH_SIZE = 500
+
+
+def is_popular(author):
+    """Посты популярных авторов не раскладываются по лентам при записи."""
+    return (
+        Follow.objects.filter(author=author).count()
+        >= settings.TIMELINE_FANOUT_LIMIT
+    )
+
+
+def popular_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются напрямую."""
+    return list(
+        User.objects.filter(
+            pk__in=Follow.objects.filter(user=user).values('author')
+        )
+        .annotate(followers=Count('following'))
+        .filter(followers__gte=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('pk', flat=True)
+    )
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    if is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_ids, author):
+    """Добавляет все посты автора в ленты перечисленных пользователей."""
+    posts = list(
+        Post.objects.filter(author=author).values_list('pk', 'pub_date')
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id in user_ids
+            for post_id, pub_date in posts
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def rebuild_for_authors(author_ids):
+    """
+    Раскладывает посты авторов по лентам всех их подписчиков: нужно
+    после массовой загрузки, которая обходит сигналы.
+    """
+    for author_id in author_ids:
+        if is_popular(author_id):
+            continue
+        backfill(
+            Follow.objects.filter(
+                author=author_id
+            ).values_list('user_id', flat=True),
+            author_id,
+        )
+
+
+def follow(user, author):
+    if not is_popular(author):
+        backfill([user.pk], author)
+
+
+def unfollow(user, author):
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+    followers = Follow.objects.filter(author=author)
+    if followers.count() == settings.TIMELINE_FANOUT_LIMIT - 1:
+        # Автор перестал быть популярным: пока он им был, его посты
+        # читались напрямую, теперь их нужно разложить по лентам.
+        backfill(followers.values_list('user_id', flat=True), author)
+
+
+class Timeline:
+    """
+    Лента подписок пользователя, упорядоченная по (-pub_date, -id).
+
+    Разложенные записи листаются по индексу (user, -pub_date, -post)
+    самой таблицы лент, без соединения с постами и без сортировки.
+    Посты популярных авторов берутся по индексу (author, -pub_date, -id)
+    и сливаются с записями по той же позиции. Из таблицы постов
+    читается только выбранная страница.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.popular = popular_authors(user)
+
+    def sources(self):
+        """(запрос, поле id поста) для каждой части ленты."""
+        yield TimelineEntry.objects.filter(user=self.user), 'post'
+        if self.popular:
+            yield Post.objects.filter(author__in=self.popular), 'id'
+
+    def positions(self, limit, after=None, direction='next'):
+        """
+        До limit позиций (pub_date, id поста) в порядке обхода: для
+        "next" от новых к старым, для "prev" наоборот. after — позиция,
+        за которой начинать.
+        """
+        forward = direction == 'next'
+        merged = set()
+        for queryset, field in self.sources():
+            if after is not None:
+                pub_date, pk = after
+                lookup = 'lt' if forward else 'gt'
+                queryset = queryset.filter(
+                    Q(**{f'pub_date__{lookup}': pub_date})
+                    | Q(pub_date=pub_date, **{f'{field}__{lookup}': pk})
+                )
+            order = ('-pub_date', f'-{field}') if forward else (
+                'pub_date', field
+            )
+            merged.update(
+                queryset.order_by(*order).values_list('pub_date', field)[
+                    :limit
+                ]
+            )
+        # Пост популярного автора мог попасть в ленты, пока тот им не был
+        return sorted(merged, reverse=forward)[:limit]
+
+    def posts(self, positions):
+        """Посты для позиций, в том же порядке."""
+        posts = Post.objects.for_listing().in_bulk(
+            [pk for _, pk in positions]
+        )
+        return [posts[pk] for _, pk in positions if pk in posts]
+
+    def count(self):
+        # Посты, попавшие в обе части, посчитаются дважды: как и в
+        # WindowedPaginator, число может быть приблизительным
+        return sum(queryset.count() for queryset, _ in self.sources())
+
+    def __getitem__(self, key):
+        return self.posts(self.positions(key.stop)[key])
+
+
+class TimelinePaginator(CursorPaginator):
+    """CursorPaginator по Timeline, а не по запросу к постам."""
+
+    def fetch(self, pub_date, pk, direction, limit):
+        timeline = self.object_list
+        return timeline.posts(
+            timeline.positions(limit, (pub_date, pk), direction)
+        )
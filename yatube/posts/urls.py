@@ -1,14 +1,35 @@
 from django.urls import path
 from . import views
-from django.views.decorators.cache import cache_page
+from .page_cache import (
+    cache_versioned, group_scopes, index_scopes, post_scopes, profile_scopes,
+)
 
 app_name = "posts"
 
 urlpatterns = [
-    path("", cache_page(20)(views.index), name="index"),
-    path("group/<slug:slug>/", views.group_posts, name="group_list"),
-    path("profile/<str:username>/", views.profile, name="profile"),
-    path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
+    path("", cache_versioned(index_scopes)(views.index), name="index"),
+    path(
+        "group/<slug:slug>/",
+        cache_versioned(group_scopes)(views.group_posts),
+        name="group_list"
+    ),
+    path(
+        "profile/<str:username>/",
+        cache_versioned(profile_scopes)(views.profile),
+        name="profile"
+    ),
+    path(
+        "posts/<int:post_id>/",
+        cache_versioned(post_scopes)(views.post_detail),
+        name="post_detail"
+    ),
+    path(
+        "posts/<int:post_id>/comments/",
+        cache_versioned(post_scopes)(views.post_comments),
+        name="post_comments"
+    ),
+    path("search/", views.search, name="search"),
+    path("export/", views.export_posts, name="export"),
     path("create/", views.create_post, name="create_post"),
     path("posts/<int:post_id>/edit/", views.post_edit, name="post_edit"),
     path('posts/<int:post_id>/comment/',
@@ -1,17 +1,33 @@
 from django.shortcuts import render, get_object_or_404
 from posts.forms import PostForm
-from .models import Group, Post, User, Comment
-from django.core.paginator import Paginator
+from .models import Group, Post, User
 from django.shortcuts import redirect
+from django.utils.http import urlencode
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import transaction
+from django.http import (
+    HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
+from core.ratelimit import ratelimit
 from .forms import CommentForm
 from .models import Follow
+from .counters import user_stats
+from .pagination import (
+    SELECT_LIMIT, CursorPaginator, WindowedPaginator, comment_page,
+)
+from .search import SearchResults
+from . import thumbnails
+from .export import FORMATS, export, parse_bound
+from .timeline import Timeline, TimelinePaginator
 import random
 
 
-def paginator(request, posts):
-    SELECT_LIMIT = 10
-    paginator = Paginator(posts.order_by("-pub_date"), SELECT_LIMIT)
+def paginator(request, posts, count=None, paginator_class=CursorPaginator):
+    paginator = paginator_class(posts, count_hint=count)
+    cursor = request.GET.get("cursor")
+    if cursor:
+        return paginator.get_cursor_page(cursor)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
     return page_obj
@@ -19,8 +35,7 @@ def paginator(request, posts):
 
 # @cache_page(20)
 def index(request):
-    post_list = Post.objects.all().select_related('author')\
-        .order_by("-pub_date")
+    post_list = Post.objects.for_listing()
     page_obj = paginator(request, post_list)
     context = {
         "page_obj": page_obj,
@@ -30,7 +45,7 @@ def index(request):
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group=group)
+    post_list = group.posts.for_listing()
     page_obj = paginator(request, post_list)
     context = {
         "group": group,
@@ -41,32 +56,32 @@ def group_posts(request, slug):
 
 # @login_required
 def profile(request, username):
-    author = User.objects.get(username__exact=username)
-    post_list = author.posts.order_by("-pub_date")
-    post_count = post_list.count()
-    following = (request.user.is_authenticated
-                 and author.following.filter(user=request.user).exists())
-    page_obj = paginator(request, post_list)
+    author = get_object_or_404(User, username__exact=username)
+    post_list = author.posts.for_listing()
+    stats = user_stats(author)
+    page_obj = paginator(request, post_list, count=stats.posts_count)
     context = {
         "page_obj": page_obj,
         "author": author,
-        "post_count": post_count,
-        'following': following,
+        "post_count": stats.posts_count,
+        "stats": stats,
     }
     return render(request, "posts/profile.html", context)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    posts = Post.objects.filter(author=post.author)
-    post_count = posts.count()
-    comments = Comment.objects.filter(post=post_id)
+    post = get_object_or_404(Post.objects.for_listing(), pk=post_id)
+    post_count = user_stats(post.author).posts_count
+    # Первая порция комментариев, остальные догружает post_comments
+    comments, comments_cursor = comment_page(post.comments.for_thread())
     if request.method == 'POST':
         form = CommentForm(request.POST)
         if form.is_valid():
             comment = form.save(commit=False)
             comment.post = post
-            comment.save()
+            # Счётчик комментариев поста пишется в той же транзакции
+            with transaction.atomic():
+                comment.save()
             form = CommentForm()
     else:
         form = CommentForm()
@@ -75,23 +90,66 @@ def post_detail(request, post_id):
         "post_count": post_count,
         "form": form,
         "comments": comments,
-
+        "comments_cursor": comments_cursor,
     }
     return render(request, "posts/post_detail.html", context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев: HTML-фрагмент или ?format=json."""
+    post = get_object_or_404(Post.objects.only("pk"), pk=post_id)
+    comments, comments_cursor = comment_page(
+        post.comments.for_thread(), request.GET.get("cursor")
+    )
+    if request.GET.get("format") == "json":
+        return JsonResponse({
+            "comments": [
+                {
+                    "id": comment.pk,
+                    "author": comment.author.username,
+                    "text": comment.text,
+                    "created": comment.created,
+                }
+                for comment in comments
+            ],
+            "next_cursor": comments_cursor,
+        })
+    context = {
+        "post": post,
+        "comments": comments,
+        "comments_cursor": comments_cursor,
+    }
+    return render(request, "posts/includes/comments.html", context)
+
+
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page_obj = WindowedPaginator(
+        SearchResults(query), SELECT_LIMIT
+    ).get_page(request.GET.get("page"))
+    context = {
+        "query": query,
+        "page_obj": page_obj,
+        "paginator_query": urlencode({"q": query}),
+    }
+    return render(request, "posts/search.html", context)
+
+
 @login_required
 def create_post(request):
     if request.method == "POST":
-        form = PostForm(request.POST)
+        form = PostForm(request.POST, files=request.FILES or None)
 
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            with transaction.atomic():
+                post.save()
+            if post.image:
+                thumbnails.schedule(post)
             return redirect("posts:profile", request.user)
-
-    form = PostForm()
+    else:
+        form = PostForm()
     return render(request, "posts/create_post.html", {"form": form})
 
 
@@ -108,7 +166,10 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            form.save()
+        if "image" in form.changed_data:
+            thumbnails.schedule(post)
         return redirect("posts:post_detail", post_id=post_id)
 
     context = {
@@ -129,17 +190,19 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     title = 'Публикации избранных авторов'
-    posts = Post.objects.filter(author__following__user=request.user)
     # paginator = Paginator(posts, 10)
     # posts = Post.objects.all().order_by("-pub_date")
-    page_obj = paginator(request, posts)
+    page_obj = paginator(
+        request, Timeline(request.user), paginator_class=TimelinePaginator
+    )
     # page_number = request.GET.get('page')
     # page_obj = paginator.get_page(page_number)
     context = {
@@ -150,13 +213,15 @@ def follow_index(request):
 
 
 @login_required
+@ratelimit()
 def profile_follow(request, username):
     follow_author = get_object_or_404(User, username=username)
     if follow_author != request.user:
-        Follow.objects.get_or_create(
-            author=follow_author,
-            user=request.user,
-        )
+        with transaction.atomic():
+            Follow.objects.get_or_create(
+                author=follow_author,
+                user=request.user,
+            )
     return redirect('posts:profile', username)
 
 
@@ -164,11 +229,38 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     follow_author = get_object_or_404(User, username=username)
     data_follow = request.user.follower.filter(author=follow_author)
-    data_follow.delete()
+    with transaction.atomic():
+        data_follow.delete()
 
     return redirect('posts:profile', username)
 
 
+@staff_member_required
+def export_posts(request):
+    params = request.GET
+    output_format = params.get("format", "ndjson")
+    since = params.get("since")
+    until = params.get("until")
+    try:
+        lines = export(
+            output_format,
+            params.getlist("model"),
+            author=params.get("author") or None,
+            group=params.get("group") or None,
+            since=parse_bound(since) if since else None,
+            until=parse_bound(until, end=True) if until else None,
+        )
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(
+        lines, content_type=f"{FORMATS[output_format]}; charset=utf-8"
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="export.{output_format}"'
+    )
+    return response
+
+
 def joke(request):
     context = {}
 
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -43,28 +44,43 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    "core.profiler.ProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "core.staticfiles.StaticFilesMiddleware",
+    "core.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.ratelimit.RateLimitMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
 ROOT_URLCONF = "yatube.urls"
 
+TEMPLATE_LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+if not DEBUG:
+    # Шаблоны компилируются один раз на процесс. С DEBUG не кешируем,
+    # чтобы правки шаблонов были видны без перезапуска
+    TEMPLATE_LOADERS = [
+        ("django.template.loaders.cached.Loader", TEMPLATE_LOADERS),
+    ]
+
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates, сообщающий время рендеринга профилировщику
+        "BACKEND": "core.template_backends.ProfiledDjangoTemplates",
+        "NAME": "django",
         "DIRS": [os.path.join(BASE_DIR, "templates")],
-        "APP_DIRS": True,
         "OPTIONS": {
+            "loaders": TEMPLATE_LOADERS,
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -91,6 +107,16 @@ DATABASES = {
 }
 
 
+# Сессии и пользователи читаются из общего кеша, база — только при
+# промахе (сессии пишутся в обе). Кеш без памяти процесса: выход должен
+# сразу действовать во всех воркерах
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+SESSION_CACHE_ALIAS = "shared"
+
+AUTHENTICATION_BACKENDS = ["core.auth.CachedModelBackend"]
+USER_CACHE_ALIAS = "shared"
+USER_CACHE_TIMEOUT = 60 * 60
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -131,6 +157,12 @@ STATIC_URL = "/static/"
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
 
+# collectstatic кладёт сюда файлы с хешами в именах и их сжатые копии,
+# раздаёт их core.staticfiles.StaticFilesMiddleware
+STATIC_ROOT = os.path.join(BASE_DIR, "static_collected")
+
+STATICFILES_STORAGE = "core.staticfiles.CompressedManifestStaticFilesStorage"
+
 LOGIN_URL = "users:login"
 LOGIN_REDIRECT_URL = "posts:index"
 # LOGOUT_REDIRECT_URL = 'posts:index'
@@ -155,15 +187,83 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий для всех воркеров кеш в файле SQLite (core.cache.SQLiteCache),
+# перед ним — короткоживущий кеш в памяти процесса
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_TIMEOUT': 5,
+            'L1_MAX_ENTRIES': 1000,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'TIMEOUT': 60 * 60 * 6,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+# Тесты пишут в свой файл: cache.clear() в них иначе стирает рабочий кеш
+if 'test' in sys.argv[1:2] or 'pytest' in sys.modules:
+    CACHES['shared']['LOCATION'] = os.path.join(
+        BASE_DIR, 'cache', 'test_cache.sqlite3'
+    )
+
+# Страницы сбрасываются сигналами (posts.page_cache), поэтому их можно
+# держать в кеше долго
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+# Поколения и время сброса страниц — в кеше без памяти процесса, чтобы
+# сброс сразу видели все воркеры
+PAGE_VERSION_CACHE_ALIAS = 'shared'
+
+# Карточки постов кешируются по (id, версия поста), поэтому сбрасывать
+# их не нужно, устаревшие вытесняются сами
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Число постов в ленте кешируется на столько секунд; ленты без
+# фильтров длиннее порога считаются по статистике таблицы
+# (posts.pagination.WindowedPaginator)
+PAGINATOR_COUNT_TIMEOUT = 60
+PAGINATOR_APPROX_COUNT_THRESHOLD = 100000
+
+# Авторы с таким числом подписчиков не раскладывают посты по лентам
+# при публикации, их посты подмешиваются в ленту при чтении
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Полнотекстовый поиск по постам, см. posts.search
+SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+
+# Потоки, считающие миниатюры картинок (posts.thumbnails);
+# 0 — считать сразу при сохранении поста
+THUMBNAIL_WORKERS = 2
+
+# Загруженные картинки уменьшаются до этих размеров с сохранением
+# пропорций и пересжимаются (posts.images)
+IMAGE_MAX_SIZE = (2048, 2048)
+IMAGE_QUALITY = 85
+# Картинки без ссылок моложе стольких секунд не удаляются (core.storage)
+MEDIA_GRACE = 60 * 60
+
+# Лимиты частоты запросов по именам адресов (core.ratelimit): на
+# пользователя и на IP. Middleware проверяет запросы этих методов,
+# profile_follow пишет по GET и ограничен декоратором
+RATE_LIMIT_METHODS = ('POST',)
+RATE_LIMITS = {
+    'posts:create_post': {'user': '10/m', 'ip': '30/m'},
+    'posts:post_edit': {'user': '30/m', 'ip': '90/m'},
+    'posts:add_comment': {'user': '20/m', 'ip': '60/m'},
+    'posts:post_detail': {'user': '20/m', 'ip': '60/m'},
+    'posts:profile_follow': {'user': '30/m', 'ip': '90/m'},
 }
 
-INTERNAL_IPS = [
-    '127.0.0.1',
-]
+# Доля запросов, которые замеряет core.profiler, и сколько последних
+# замеров хранит каждый процесс; сводка — на /__perf__/
+PROFILER_SAMPLE_RATE = 0.05
+PROFILER_BUFFER_SIZE = 5000
 # ALLOWED_HOSTS = [
 #     'www.belova.pythonanywhere.com',
 #     'belova.pythonanywhere.com',
@@ -18,13 +18,15 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import perf
+
 urlpatterns = [
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("", include("posts.urls", namespace="posts")),
     path("admin/", admin.site.urls),
     path("about/", include("about.urls", namespace="about")),
-    # path('__debug__/', include('debug_toolbar.urls')),  # delete this.RGenius
+    path("__perf__/", perf, name="perf"),
 ]
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
@@ -34,7 +36,3 @@ if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )
-
-if settings.DEBUG:
-    import debug_toolbar
-    urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)